@@ -86,6 +86,9 @@ class SimpleGoBoard(object):
         self.liberty_of = np.full(self.maxpoint, NULLPOINT, dtype = np.int32)
         self._initialize_empty_points(self.board)
         self._initialize_neighbors()
+        # gomoku winner so far, and its value before each gomoku move
+        self.winner = None
+        self.winner_stack = []
 
     def copy(self):
         b = SimpleGoBoard(self.size)
@@ -95,6 +98,8 @@ class SimpleGoBoard(object):
         b.current_player = self.current_player
         assert b.maxpoint == self.maxpoint
         b.board = np.copy(self.board)
+        b.winner = self.winner
+        b.winner_stack = list(self.winner_stack)
         return b
 
     def row_start(self, row):
@@ -347,6 +352,9 @@ class SimpleGoBoard(object):
         if self.board[point] != EMPTY:
             return False
         self.board[point] = color
+        self.winner_stack.append(self.winner)
+        if self.winner is None and self.point_check_game_end_gomoku(point):
+            self.winner = color
         self.current_player = GoBoardUtil.opponent(color)
         return True
         
@@ -405,18 +413,11 @@ class SimpleGoBoard(object):
     def check_game_end_gomoku(self):
         """
             Check if the game ends for the game of Gomoku.
+            The winner is updated by play_move_gomoku and undo_move_gomoku,
+            from the four lines through the last move only.
             """
-        white_points = where1d(self.board == WHITE)
-        black_points = where1d(self.board == BLACK)
-        
-        for point in white_points:
-            if self.point_check_game_end_gomoku(point):
-                return True, WHITE
-    
-        for point in black_points:
-            if self.point_check_game_end_gomoku(point):
-                return True, BLACK
-
+        if self.winner is not None:
+            return True, self.winner
         return False, None
 
     def _point_direction_check_connect_open_four_gomoko(self, point, shift):
@@ -685,4 +686,5 @@ class SimpleGoBoard(object):
         Undo the move
         """
         self.board[point] = EMPTY
+        self.winner = self.winner_stack.pop()
         self.current_player = GoBoardUtil.opponent(self.current_player)
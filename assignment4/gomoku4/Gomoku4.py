@@ -5,13 +5,15 @@
 from gtp_connection import GtpConnection
 from board_util import GoBoardUtil, EMPTY
 from simple_board import SimpleGoBoard
+from threat_search import find_forced_win
+from opening_book import open_book
+from time_manager import TimeManager
 
 import random
 import numpy as np
 
 def undo(board,move):
-    board.board[move]=EMPTY
-    board.current_player=GoBoardUtil.opponent(board.current_player)
+    board.undo_move_gomoku()
 
 def play_move(board, move, color):
     board.play_move_gomoku(move, color)
@@ -45,6 +47,20 @@ class GomokuSimulationPlayer(object):
         self.name="Gomoku3"
         self.version = 3.0
         self.best_move=None
+        # seconds per genmove, set by the timelimit command.
+        # get_move deepens iteratively until its TimeManager stops it.
+        self.timelimit=60
+        # TimeManager of the last genmove
+        self.time_manager=None
+        # moves of the first plies, None without a book file
+        self.book=open_book()
+        # BoardSearcher of the last search, for its statistics
+        self.searcher=None
+        # reply of the opponent expected by the last search, or None
+        self.predicted_reply=None
+        # whether ponder searched since the last genmove, and its reply
+        self.pondered=False
+        self.ponder_reply=None
     
     def set_playout_policy(self, playout_policy='random'):
         assert(playout_policy in ['random', 'rule_based'])
@@ -88,8 +104,30 @@ class GomokuSimulationPlayer(object):
         """
         The genmove function called by gtp_connection
         """
-        _, row, col = board.board_searcher.search(board.twoDBoard, color_to_play, board.maxdepth)
+        max_depth = len(board.get_empty_points())
+        self.time_manager = TimeManager(self.timelimit, max_depth, board.size)
+        self.predicted_reply = None
+        # a ponder of the reply that was played, or of all the replies,
+        # searched this position: keep its entries
+        continued = self.pondered and (self.ponder_reply is None or
+            (len(board.moves) > 0 and board.moves[-1][0] == self.ponder_reply))
+        self.pondered = False
+        if self.book is not None and color_to_play == board.current_player:
+            move = self.book.probe(board)
+            if move is not None:
+                return move
+        # a forced win needs no full-width search
+        line = find_forced_win(board, color_to_play)
+        if line:
+            return line[0]
+        self.searcher = board.board_searcher
+        _, row, col = self.searcher.search(board.twoDBoard, color_to_play,
+                                           max_depth, time_manager=self.time_manager,
+                                           new_search=not continued)
         # print("generated row = {}, col = {}".format(row, col))
+        pv = self.searcher.pv
+        if len(pv) > 1 and pv[0] == (row, col):
+            self.predicted_reply = board.twoD_coord_to_point(*pv[1])
         return board.twoD_coord_to_point(row, col)
 
         # moves=GoBoardUtil.generate_legal_moves_gomoku(board)
@@ -119,12 +157,37 @@ class GomokuSimulationPlayer(object):
         # assert(best_move is not None)
         # return best_move
 
+    def ponder(self, board, color, stop_token):
+        """
+        Search on the opponent's time, after the genmove of color
+        played on board, until stop_token is stopped (see ponder.py).
+        The position after the reply predicted by the search of the
+        genmove is searched for color, or without a prediction, the
+        position of the opponent. The searches of the next genmove
+        find the results in the transposition table, which the copies
+        of board share.
+        """
+        board = board.copy()
+        reply = self.predicted_reply
+        if reply is not None and board.get_color(reply) == EMPTY:
+            board.play_move_gomoku(reply, GoBoardUtil.opponent(color))
+            to_play = color
+        else:
+            reply = None
+            to_play = GoBoardUtil.opponent(color)
+        self.pondered = True
+        self.ponder_reply = reply
+        if board.winner is not None or len(board.get_empty_points()) == 0:
+            return
+        board.board_searcher.search(board.twoDBoard, to_play,
+            len(board.get_empty_points()), stop_token=stop_token)
+
 def run():
     """
     start the gtp connection and wait for commands.
     """
     board = SimpleGoBoard(7)
-    con = GtpConnection(GomokuSimulationPlayer(), board)
+    con = GtpConnection(GomokuSimulationPlayer(), board, use_bitboard=True, ponder=True)
     con.start_connection()
 
 if __name__=='__main__':
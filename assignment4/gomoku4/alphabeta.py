@@ -2,8 +2,7 @@ from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER
 #from profilehooks import profile
 
 def undo(board,move):
-    board.board[move]=EMPTY
-    board.current_player=GoBoardUtil.opponent(board.current_player)
+    board.undo_move_gomoku()
 
 def game_end(board):
     game_end, winner = board.check_game_end_gomoku()
@@ -0,0 +1,200 @@
+"""
+bit_board.py
+
+Implements a Gomoku board that stores each color as an integer bitboard.
+It offers the same gomoku API as SimpleGoBoard:
+- play_move_gomoku / undo_move_gomoku
+- get_empty_points
+- check_game_end_gomoku / point_check_game_end_gomoku
+
+Bit p of a bitboard is set iff point p holds a stone of that color.
+Points use the same padded 1-dimensional encoding as SimpleGoBoard
+(see GoBoardUtil.coord_to_point), so the border column between two rows
+is never set, and a line in one of the four directions
+(1, NS, NS + 1, NS - 1) never wraps into the next row.
+"""
+
+import numpy as np
+from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, \
+                       PASS, is_black_white
+from simple_board import SimpleGoBoard
+
+"""
+Precomputed masks, shared by all boards of the same size.
+_tables[size] = (on_board_mask, five_windows)
+five_windows[point] is the list of masks of every 5-in-a-row window,
+in any of the four directions, that contains point.
+"""
+_tables = {}
+
+def _build_tables(size):
+    NS = size + 1
+    maxpoint = size * size + 3 * (size + 1)
+    on_board = [False] * maxpoint
+    on_board_mask = 0
+    for row in range(1, size + 1):
+        for col in range(1, size + 1):
+            point = row * NS + col
+            on_board[point] = True
+            on_board_mask |= 1 << point
+    five_windows = [[] for _ in range(maxpoint)]
+    for point in range(maxpoint):
+        if not on_board[point]:
+            continue
+        for d in (1, NS, NS + 1, NS - 1):
+            # all windows point + k * d, k = start .. start + 4
+            # with start in -4 .. 0
+            for start in range(-4, 1):
+                window = 0
+                for k in range(start, start + 5):
+                    p = point + k * d
+                    if p < 0 or p >= maxpoint or not on_board[p]:
+                        break
+                    window |= 1 << p
+                else:
+                    five_windows[point].append(window)
+    return on_board_mask, five_windows
+
+def get_tables(size):
+    if size not in _tables:
+        _tables[size] = _build_tables(size)
+    return _tables[size]
+
+
+class BitGoBoard(SimpleGoBoard):
+    """
+    SimpleGoBoard for the game of gomoku, backed by two integer bitboards.
+    The numpy array self.board is rebuilt lazily from the bitboards,
+    and only for code that reads it outside the search (GTP display, Go rules).
+    It is a read-only view: change the position with play_move_gomoku
+    and undo_move_gomoku only.
+    """
+
+    @property
+    def board(self):
+        if self._array_dirty:
+            array = np.copy(self._empty_array)
+            array[self._bit_points(self.black_bits)] = BLACK
+            array[self._bit_points(self.white_bits)] = WHITE
+            self._array = array
+            self._array_dirty = False
+        return self._array
+
+    @board.setter
+    def board(self, array):
+        self._array = array
+        self._array_dirty = False
+
+    def reset(self, size):
+        """
+        Creates a start state, an empty board with the given size
+        """
+        SimpleGoBoard.reset(self, size)
+        self._empty_array = np.copy(self._array)
+        self.on_board_mask, self.five_windows = get_tables(size)
+        self.black_bits = 0
+        self.white_bits = 0
+        self.empty_bits = self.on_board_mask
+
+    def copy(self):
+        self.transposition_table()
+        b = BitGoBoard.__new__(BitGoBoard)
+        b.__dict__.update(self.__dict__)
+        self._copy_position_to(b)
+        # the bitboards are immutable integers, the array is rebuilt from them
+        b._array_dirty = True
+        return b
+
+    def get_color(self, point):
+        bit = 1 << int(point)
+        if self.black_bits & bit:
+            return BLACK
+        if self.white_bits & bit:
+            return WHITE
+        if self.empty_bits & bit:
+            return EMPTY
+        return BORDER
+
+    def get_empty_points(self):
+        """
+        Return:
+            The empty points on the board
+        """
+        return np.array(self._bit_points(self.empty_bits), dtype = np.int64)
+
+    def get_candidate_moves(self):
+        """
+        Return:
+            The empty points within candidate_radius of a stone,
+            or all the empty points if there is no stone
+        """
+        if not self.moves:
+            return self.get_empty_points()
+        return np.array(self._bit_points(self.near_bits & self.empty_bits),
+                        dtype = np.int64)
+
+    def is_legal_gomoku(self, point, color):
+        """
+            Check whether it is legal for color to play on point, for the game of gomoku
+            """
+        return bool(self.empty_bits >> int(point) & 1)
+
+    def play_move_gomoku(self, point, color):
+        """
+            Play a move of color on point, for the game of gomoku
+            Returns boolean: whether move was legal
+            """
+        assert is_black_white(color)
+        assert point != PASS
+        bit = 1 << int(point)
+        if not self.empty_bits & bit:
+            return False
+        self.empty_bits ^= bit
+        if color == BLACK:
+            self.black_bits |= bit
+        else:
+            self.white_bits |= bit
+        self._array_dirty = True
+        row, col = self._point_to_2d_coord(point)
+        self.twoDBoard[row][col] = color
+        self.moves.append((point, color, self.winner))
+        self._near_stack.append(self.near_bits)
+        self.near_bits |= self._neighbourhood[point]
+        self.hash ^= self.zobrist[color][point]
+        self._update_hashes(point, color)
+        if self.winner is None and self.point_check_game_end_gomoku(point):
+            self.winner = color
+        self.current_player = GoBoardUtil.opponent(color)
+        return True
+
+    def undo_move_gomoku(self):
+        last_move, last_color, self.winner = self.moves.pop()
+        self.near_bits = self._near_stack.pop()
+        self.hash ^= self.zobrist[last_color][last_move]
+        self._update_hashes(last_move, last_color)
+        bit = 1 << int(last_move)
+        self.empty_bits |= bit
+        if last_color == BLACK:
+            self.black_bits &= ~bit
+        else:
+            self.white_bits &= ~bit
+        self._array_dirty = True
+        row, col = self._point_to_2d_coord(last_move)
+        self.twoDBoard[row][col] = EMPTY
+        self.current_player = GoBoardUtil.opponent(self.current_player)
+
+    def point_check_game_end_gomoku(self, point):
+        """
+            Check if the point causes the game end for the game of Gomoko.
+            """
+        color = self.get_color(point)
+        if color == BLACK:
+            bits = self.black_bits
+        elif color == WHITE:
+            bits = self.white_bits
+        else:
+            return False
+        for window in self.five_windows[point]:
+            if bits & window == window:
+                return True
+        return False
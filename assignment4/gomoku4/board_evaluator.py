@@ -94,6 +94,14 @@ class BoardEvaluator(object):
 	# in 4 directinos: horizontal, vertical, diagonal(left-hand or right-hand)
 	# return score difference between players based on analysis result
 	def __evaluate (self, board, turn):
+		self.count_shapes(board)
+		return self.score_counts(turn)
+
+
+	# analyze board in 4 directions
+	# fill self.count with the number of occurences of each situation per color,
+	# and self.weight with the total POS weight of the stones of each color
+	def count_shapes (self, board):
 		record = self.record
 		count = self.count
 		unanalyzed = self.unanalyzed
@@ -142,7 +150,32 @@ class BoardEvaluator(object):
 						ch = record[i][j][k]
 						if ch in check:
 							count[stone][ch] += 1
-		
+
+		# include weight for each intersection
+		# add weight of 3 to the center, 2 to the outer square, then
+		# 1, at last 0 to the outermost square.
+		weight = [ 0, 0, 0 ]
+		# for each intersection with a stone, add weight
+		for i in range(7):
+			for j in range(7):
+				stone = board[i][j]
+				if stone != 0:
+					weight[stone] += self.POS[i][j]
+		self.weight = weight
+	
+
+	# return score difference between players based on
+	# self.count and self.weight
+	def score_counts (self, turn):
+		count = self.count
+		five = self.five
+		four = self.four
+		three =  self.three
+		two = self.two
+		cFour = self.cFour
+		cThree = self.cThree
+		cTwo = self.cTwo
+
 		# return score if there is a five
 		black = 1
 		white = 2
@@ -250,23 +283,9 @@ class BoardEvaluator(object):
 				wvalue += count[white][cTwo]
 		
 		
-		# include weight for each intersection
-		# add weight of 3 to the center, 2 to the outer square, then
-		# 1, at last 0 to the outermost square.
-		wc = 0
-		bc = 0
-		# for each intersection with a stone, add weight
-		for i in range(7):
-			for j in range(7):
-				stone = board[i][j]
-				if stone != 0:
-					if stone == white:
-						wc += self.POS[i][j]
-					else:
-						bc += self.POS[i][j]
 		# add total weight to total score
-		wvalue += wc
-		bvalue += bc
+		wvalue += self.weight[white]
+		bvalue += self.weight[black]
 		
 		# return score differnece between players
 		if turn == white:
@@ -1,12 +1,37 @@
-from board_evaluator import BoardEvaluator
+from time_manager import StopToken
+from incremental_evaluator import IncrementalEvaluator
+from transposition_table import TranspositionTable, EXACT, LOWER, UPPER
 
 
 class BoardSearcher(object):
 	"""Board searcher for best next move."""
 
-	def __init__ (self):
-		self.evaluator = BoardEvaluator()
-		self.board = [ [ 0 for n in range(7) ] for i in range(7) ]
+	def __init__ (self, goboard, tt = None):
+		# the evaluator is told about every move made by the search,
+		# and only re-analyzes the lines through it
+		self.evaluator = IncrementalEvaluator()
+		# moves are made on goboard, which keeps self.board (its twoDBoard)
+		# and its Zobrist hash up to date
+		self.goboard = goboard
+		self.board = goboard.twoDBoard
+		# tt can be shared with the searchers of copies of goboard
+		self.tt = tt if tt is not None else TranspositionTable()
+		self.use_tt = True		# False while the score of a decided search is recomputed
+		self.bestmove = None
+		self.stop_token = None	# StopToken of an iterative search
+		self.stopped = False
+		self.nodes = 0
+		self.pv = []			# principal variation of the last completed iteration
+		self.completed_depth = 0
+		# dynamic move ordering, see genMoves
+		self.killers = []		# killers[ply]: the last 2 moves that caused a cutoff at ply
+		self.history = [ None, [ [ 0 ] * 7 for i in range(7) ],
+						[ [ 0 ] * 7 for i in range(7) ] ]	# history[turn][row][col]
+		# per ply of the last search: nodes, beta cutoffs,
+		# and cutoffs by the first move searched
+		self.ply_nodes = []
+		self.ply_cutoffs = []
+		self.ply_first_cutoffs = []
 		self.gameover = 0
 		self.overvalue = 0
 		self.maxdepth = 3	# set the max depth to 3 so that the running time
@@ -14,22 +39,69 @@ class BoardSearcher(object):
 							# depth: 1 - <1 sec, 2 - a few sec, 3 - up to 4 min
 
 
-	def genMoves(self, turn):
-		"""Generate all legal moves for the current board.
+	def genMoves(self, turn, ply = None):
+		"""Generate the candidate moves of the current board.
 
+		The moves are the empty points near a stone kept by goboard
+		(see SimpleGoBoard.get_candidate_moves): a five or a four is always
+		made or blocked next to a stone, so the far points are not searched.
 		store the score and position of each move in a list in format of (score, i, j)
+		Without ply, the score is the static POS weight. At a ply of the search,
+		it is (threat, killer, history, POS): threats made or broken first
+		(see IncrementalEvaluator.move_threat), then the killer moves of the ply,
+		then the moves with the most cutoffs for turn, then the centre.
 		"""
 		moves = []
-		board = self.board
+		NS = self.goboard.NS
+		cells = [divmod(int(point), NS) for point in self.goboard.get_candidate_moves()]
 		POSES = self.evaluator.POS
-		for i in range(7):
-			for j in range(7):
-				if board[i][j] == 0:
-					score = POSES[i][j]
-					moves.append((score, i, j))
+		if ply is None:
+			for row, col in cells:
+				i, j = row - 1, col - 1
+				score = POSES[i][j]
+				moves.append((score, i, j))
+		else:
+			move_threat = self.evaluator.move_threat
+			killers = self.killers[ply] if ply < len(self.killers) else []
+			history = self.history[turn]
+			for row, col in cells:
+				i, j = row - 1, col - 1
+				killer = 0
+				if (i, j) in killers:
+					killer = 2 - killers.index((i, j))
+				score = (move_threat(i, j, turn), killer, history[i][j], POSES[i][j])
+				moves.append((score, i, j))
 	
 		moves.sort(reverse=True)	# sort moves in reverse order, i.e., with decreasing scores
 		return moves
+
+	def __cutoff(self, turn, ply, depth, move, index):
+		"""Record a beta cutoff by the index-th move searched at ply."""
+		self.ply_cutoffs[ply] += 1
+		if index == 0:
+			self.ply_first_cutoffs[ply] += 1
+		while len(self.killers) <= ply:
+			self.killers.append([])
+		killers = self.killers[ply]
+		if move not in killers:
+			killers.insert(0, move)
+			del killers[2:]
+		row, col = move
+		self.history[turn][row][col] += depth * depth
+
+	def stats(self):
+		"""Nodes, cutoff rate, first-move cutoff rate and effective branching
+		factor (nodes of the next ply per node) of each ply of the last search."""
+		lines = []
+		for ply in range(len(self.ply_nodes)):
+			nodes = self.ply_nodes[ply]
+			cutoffs = self.ply_cutoffs[ply]
+			line = "ply {} nodes {} cutoffs {} ({:.0f}%) first {:.0f}%".format(ply, nodes,
+				cutoffs, 100.0 * cutoffs / max(nodes, 1), 100.0 * self.ply_first_cutoffs[ply] / max(cutoffs, 1))
+			if ply + 1 < len(self.ply_nodes) and nodes:
+				line += " ebf {:.1f}".format(1.0 * self.ply_nodes[ply + 1] / nodes)
+			lines.append(line)
+		return "\n".join(lines)
 	
 
 	def __search(self, turn, depth, alpha = -0x7fffffff, beta = 0x7fffffff):
@@ -39,29 +111,71 @@ class BoardSearcher(object):
 		0x7fffffff == (2^31)-1, indicating a large value
 		"""
 
+		# stop cleanly when the stop token is stopped, the moves are undone
+		# on the way up and the caller discards this result
+		self.nodes += 1
+		ply = self.maxdepth - depth
+		while len(self.ply_nodes) <= ply:
+			self.ply_nodes.append(0)
+			self.ply_cutoffs.append(0)
+			self.ply_first_cutoffs.append(0)
+		self.ply_nodes[ply] += 1
+		if self.stop_token is not None and self.nodes & 63 == 0 \
+			and self.stop_token.stopped():
+			self.stopped = True
+		if self.stopped:
+			return 0
+
 		# base case: depth is 0
 		# evaluate the board and return
 		if depth <= 0:
 			score = self.evaluator.evaluate(self.board, turn)
 			return score
 
+		# look up the transposition table
+		# the key includes the side to move; the root is always searched
+		# so that its best move gets recorded. Symmetric images of a position
+		# get their own entries: the evaluator is not symmetric
+		goboard = self.goboard
+		key = goboard.hash << 1 | (turn - 1)
+		alpha_orig = alpha
+		ttmove = None
+		entry = self.tt.probe(key) if self.use_tt else None
+		if entry is not None:
+			ttdepth, bound, ttscore, ttmove = entry
+			if ttdepth >= depth and depth < self.maxdepth:
+				if bound == EXACT:
+					return ttscore
+				if bound == LOWER and ttscore >= beta:
+					return beta
+				if bound == UPPER and ttscore <= alpha:
+					return alpha
+
 		# if game over, return immediately
 		score = self.evaluator.evaluate(self.board, turn)
 		if abs(score) >= 9999 and depth < self.maxdepth: 
 			return score
 
 		# generate new moves
-		moves = self.genMoves(turn)
+		moves = self.genMoves(turn, ply)
+		# search the previous iteration's principal variation move first,
+		# then the stored best move in front of it
+		if ply < len(self.pv):
+			self.__move_to_front(moves, self.pv[ply])
+		if ttmove is not None:
+			self.__move_to_front(moves, ttmove)
 		bestmove = None
 
 		# for all current moves
 		# len(moves) == num of empty intersections on current board
 		# worst case O(m^n) or O( m!/(m-n)! ), m = num of empty spots, 
 		# 			n = depth(num of further steps this program predicts)
-		for score, row, col in moves:
+		for index, (score, row, col) in enumerate(moves):
 
 			# label current move to board
-			self.board[row][col] = turn
+			point = goboard.twoD_coord_to_point(row, col)
+			goboard.play_move_gomoku(point, turn)
+			self.evaluator.update(row, col)
 			
 			# calculate next turn
 			if turn == 1:
@@ -73,7 +187,10 @@ class BoardSearcher(object):
 			score = - self.__search(nturn, depth - 1, -beta, -alpha)
 
 			# clear current move on board
-			self.board[row][col] = 0
+			goboard.undo_move_gomoku()
+			self.evaluator.update(row, col)
+			if self.stopped:
+				return alpha
 
 			# calculate the move with best score
 			# alpha beta pruning: removes nodes that are evaluated by the minimax algorithm
@@ -83,24 +200,153 @@ class BoardSearcher(object):
 				alpha = score
 				bestmove = (row, col)
 				if alpha >= beta:
+					self.__cutoff(turn, ply, depth, bestmove, index)
 					break
 		
 		# if depth is max depth, record the best move
 		if depth == self.maxdepth and bestmove:
 			self.bestmove = bestmove
 
+		# fail-hard bounds: alpha is an upper bound if no move raised it,
+		# and a lower bound after a cutoff
+		if alpha <= alpha_orig:
+			bound = UPPER
+		elif alpha >= beta:
+			bound = LOWER
+		else:
+			bound = EXACT
+		if self.use_tt:
+			self.tt.store(key, depth, bound, alpha, bestmove)
+
 		# return current best score and its correponding move
 		return alpha
 
+	def __move_to_front(self, moves, move):
+		for k in range(len(moves)):
+			if (moves[k][1], moves[k][2]) == move:
+				moves.insert(0, moves.pop(k))
+				return
+
+	def __principal_variation(self, turn, depth):
+		"""Follow the best moves stored in the transposition table from the root."""
+		goboard = self.goboard
+		pv = []
+		for _ in range(depth):
+			entry = self.tt.probe(goboard.hash << 1 | (turn - 1))
+			if entry is None or entry[3] is None:
+				break
+			row, col = entry[3]
+			if not goboard.play_move_gomoku(goboard.twoD_coord_to_point(row, col), turn):
+				break
+			pv.append((row, col))
+			turn = 3 - turn
+		for _ in pv:
+			goboard.undo_move_gomoku()
+		return pv
+
 	# specific search
 	# args: turn: 1(black)/2(white), depth
-	def search(self, board, turn, depth=3):
+	# with a stop token, search iteratively with depth 1, 2, ... up to depth,
+	# until the token is stopped. self.bestmove is then always the best move
+	# of the last completed iteration.
+	def search(self, board, turn, depth=3, deadline=None, time_manager=None, stop_token=None,
+			   new_search=True):
+		"""Search board for turn, and return (score, row, col) of the best move.
+
+		Without deadline, time_manager nor stop_token, search to depth. Else
+		deepen iteratively up to depth, until stop_token, the token of
+		time_manager or a token of deadline (see time_manager.py) is stopped,
+		or until time_manager.should_stop after an iteration.
+		Unless new_search, the entries of the previous search are not aged,
+		so the shallow iterations do not replace them: the search continues
+		a search of the same move, made on the opponent's time.
+		"""
 		self.board = board
-		self.maxdepth = depth
+		self.evaluator.set_board(board)
 		self.bestmove = None
-		score = self.__search(turn, depth)
-		if abs(score) > 8000:
+		self.stop_token = None
+		self.stopped = False
+		self.nodes = 0
+		self.pv = []
+		self.completed_depth = 0
+		self.killers = []
+		self.ply_nodes = []
+		self.ply_cutoffs = []
+		self.ply_first_cutoffs = []
+		# keep the history of earlier searches, with less weight
+		for table in self.history[1:]:
+			for row in table:
+				for col in range(7):
+					row[col] >>= 1
+		if new_search:
+			self.tt.new_search()
+		if stop_token is None and time_manager is not None:
+			stop_token = time_manager.token
+		if stop_token is None and deadline is not None:
+			stop_token = StopToken(deadline)
+		if stop_token is None:
 			self.maxdepth = depth
-			score = self.__search(turn, 1)
+			score = self.__search(turn, depth)
+			if abs(score) > 8000:
+				score = self.__decided_score(turn, score, depth)
+			self.completed_depth = depth
+		else:
+			score = self.__iterative_search(turn, depth, stop_token, time_manager)
+		if self.bestmove is None:
+			# not even depth 1 finished in time, use the static ordering
+			_, row, col = self.genMoves(turn)[0]
+			self.bestmove = (row, col)
 		row, col = self.bestmove
-		return score, row, col
\ No newline at end of file
+		return score, row, col
+
+	def __decided_score(self, turn, score, depth):
+		"""Return the score to report for a search for depth whose score
+		is beyond 8000: the score of a search at depth 1, or if depth is more
+		than 1 and the root is decided before any move, its static score,
+		as a search below the root stops there. The depth 1 search does not
+		use the table, whose entries for the root and its children hold the
+		scores of the deeper search.
+		The best move of the search of maxdepth is kept, unless maxdepth is 1.
+		"""
+		if depth > 1:
+			static = self.evaluator.evaluate(self.board, turn)
+			if abs(static) >= 9999:
+				return static
+		maxdepth, bestmove = self.maxdepth, self.bestmove
+		use_tt = self.use_tt
+		self.maxdepth = 1
+		self.use_tt = False
+		rescore = self.__search(turn, 1)
+		self.use_tt = use_tt
+		self.maxdepth = maxdepth
+		if maxdepth > 1:
+			self.bestmove = bestmove
+		if self.stopped:
+			return score
+		return rescore
+
+	def __iterative_search(self, turn, depth, stop_token, time_manager=None):
+		self.stop_token = stop_token
+		score = 0
+		for d in range(1, depth + 1):
+			bestmove = self.bestmove
+			self.maxdepth = d
+			self.bestmove = None
+			iteration_score = self.__search(turn, d)
+			if self.stopped:
+				self.bestmove = bestmove
+				break
+			score = iteration_score
+			self.completed_depth = d
+			self.pv = self.__principal_variation(turn, d)
+			# the game is decided, deeper search will not change it;
+			# report the score as the fixed-depth search does
+			if abs(score) > 8000:
+				score = self.__decided_score(turn, score, depth)
+				break
+			if time_manager is not None:
+				time_manager.update(self.bestmove)
+				if time_manager.should_stop():
+					break
+		self.stop_token = None
+		return score
\ No newline at end of file
@@ -4,7 +4,7 @@ Utility functions for Go board.
 """
 
 import numpy as np
-from random import shuffle
+from random import shuffle, Random
 
 """
 Encoding of colors on and off a Go board.
@@ -27,6 +27,11 @@ Encoding of "not a real point", used as a marker
 """
 NULLPOINT = 0
 
+"""
+Default Chebyshev distance to a stone of the candidate moves
+"""
+CANDIDATE_RADIUS = 2
+
 """
 The largest board we allow. 
 To support larger boards the coordinate printing needs to be changed.
@@ -43,6 +48,96 @@ The [0] indexing is needed toextract the result from the singleton tuple.
 def where1d(condition):
     return np.where(condition)[0]
 
+"""
+zobrist_table: random 64 bit keys for Zobrist hashing of gomoku positions.
+table[color][point] is the key of a stone of color on point.
+The hash of a position is the xor of the keys of all its stones,
+so it can be updated incrementally on each play and undo.
+Tables use a fixed seed, so hashes are the same in every run.
+"""
+_zobrist_tables = {}
+
+def zobrist_table(maxpoint):
+    if maxpoint not in _zobrist_tables:
+        rng = Random(maxpoint)
+        _zobrist_tables[maxpoint] = [[rng.getrandbits(64) for _ in range(maxpoint)]
+                                     for _ in range(BORDER)]
+    return _zobrist_tables[maxpoint]
+
+"""
+symmetry_table: the 8 symmetries of the square board (rotations and
+reflections), as permutations of the points.
+table[s][point] is the image of point by symmetry s, table[0] is the identity.
+Points off the board are mapped to themselves.
+"""
+_symmetry_tables = {}
+
+def symmetry_table(size):
+    if size not in _symmetry_tables:
+        NS = size + 1
+        maxpoint = size * size + 3 * (size + 1)
+        transforms = [lambda r, c: (r, c), lambda r, c: (c, size + 1 - r),
+                      lambda r, c: (size + 1 - r, size + 1 - c),
+                      lambda r, c: (size + 1 - c, r), lambda r, c: (r, size + 1 - c),
+                      lambda r, c: (size + 1 - r, c), lambda r, c: (c, r),
+                      lambda r, c: (size + 1 - c, size + 1 - r)]
+        table = []
+        for transform in transforms:
+            permutation = list(range(maxpoint))
+            for row in range(1, size + 1):
+                for col in range(1, size + 1):
+                    image_row, image_col = transform(row, col)
+                    permutation[row * NS + col] = image_row * NS + image_col
+            table.append(permutation)
+        _symmetry_tables[size] = table
+    return _symmetry_tables[size]
+
+"""
+Index of the inverse of each symmetry of symmetry_table
+"""
+INVERSE_SYMMETRY = (0, 3, 2, 1, 4, 5, 6, 7)
+
+"""
+symmetric_zobrist_table: table[color][point] is the tuple of the Zobrist keys
+of a stone of color on the image of point by each of the 8 symmetries,
+to update the hashes of the 8 images of a position at once.
+"""
+_symmetric_zobrist_tables = {}
+
+def symmetric_zobrist_table(size):
+    if size not in _symmetric_zobrist_tables:
+        maxpoint = size * size + 3 * (size + 1)
+        zobrist = zobrist_table(maxpoint)
+        symmetries = symmetry_table(size)
+        _symmetric_zobrist_tables[size] = [
+            [tuple(zobrist[color][permutation[point]] for permutation in symmetries)
+             for point in range(maxpoint)]
+            for color in range(BORDER)]
+    return _symmetric_zobrist_tables[size]
+
+"""
+neighbourhood_masks: masks[point] is the bitmask (bit p set for point p)
+of the points of the board within Chebyshev distance radius of point,
+see SimpleGoBoard.get_candidate_moves.
+"""
+_neighbourhood_masks = {}
+
+def neighbourhood_masks(size, radius):
+    key = (size, radius)
+    if key not in _neighbourhood_masks:
+        NS = size + 1
+        maxpoint = size * size + 3 * (size + 1)
+        masks = [0] * maxpoint
+        for row in range(1, size + 1):
+            for col in range(1, size + 1):
+                mask = 0
+                for r in range(max(1, row - radius), min(size, row + radius) + 1):
+                    for c in range(max(1, col - radius), min(size, col + radius) + 1):
+                        mask |= 1 << (r * NS + c)
+                masks[row * NS + col] = mask
+        _neighbourhood_masks[key] = masks
+    return _neighbourhood_masks[key]
+
 def coord_to_point(row, col, boardsize):
     """
     Transform two dimensional (row, col) representation to array index.
@@ -124,6 +219,17 @@ class GoBoardUtil(object):
             legal_moves.append(move)
         shuffle(legal_moves)
         return legal_moves
+
+    @staticmethod
+    def generate_candidate_moves_gomoku(board):
+        """
+        generate a list of the candidate moves of the board for gomoku,
+        the empty points near a stone (see SimpleGoBoard.get_candidate_moves),
+        in random order.
+        """
+        moves = list(board.get_candidate_moves())
+        shuffle(moves)
+        return moves
             
     @staticmethod
     def generate_random_move_gomoku(board):
@@ -0,0 +1,244 @@
+"""
+dfpn.py
+
+Depth-first proof-number search (df-pn) solver for the gomoku solve command.
+
+A search proves or disproves that the attacker wins, a draw counting as a
+failure of the attacker. solve runs one search for the player to move,
+and if it does not win, one for the opponent to tell a draw from a loss.
+
+Proof and disproof numbers are stored from the point of view of the player
+to move at each node, as (phi, delta):
+    phi   = proof number if the attacker is to move, else disproof number
+    delta = disproof number if the attacker is to move, else proof number
+so that for every node, phi = min(delta of its children) and
+delta = sum(phi of its children).
+A node whose player to move has won has phi = 0 and delta = INF.
+
+Moves are generated from the threats of a ThreatTracker
+(see threat_tracker.py):
+- a win point of the player to move, if it has one
+- else the win points of the opponent, which must be blocked
+- else, if the opponent can play an open four, the moves that make a four
+  and the moves that stop every open four
+- else all empty points, threats first.
+The numbers of the positions are kept in a transposition table, indexed by
+the Zobrist hash of the board: a gomoku position cannot repeat, so the table
+is a directed acyclic graph of the positions and needs no cycle handling.
+
+The search polls its StopToken (see time_manager.py) every CHECK_NODES nodes:
+once it is stopped, each node undoes its move and returns, and the position
+is left unsolved.
+"""
+
+from board_util import GoBoardUtil, BLACK, WHITE
+from threat_tracker import ThreatTracker
+from threat_search import ThreatSearch
+
+"""
+Proof number of a disproven node, and disproof number of a proven node
+"""
+INF = 100000000
+"""
+Nodes searched between two polls of the stop token
+"""
+CHECK_NODES = 64
+
+class DfpnSolver(object):
+
+    def __init__(self, board, stop_token = None):
+        """
+        Solver for the current position of board. The board is used
+        for the search, and left in the same position.
+        stop_token: StopToken that cancels the search, or None
+        """
+        self.board = board
+        self.threats = ThreatTracker(board)
+        self.table = {}
+        self.attacker = None
+        self.nodes = 0
+        self.stop_token = stop_token
+        self.stopped = False
+
+    def prove(self, attacker):
+        """
+        Search until it is proven or disproven that attacker wins.
+        Return (phi, delta) of the current position,
+        or None if the stop token stopped the search.
+        """
+        self.attacker = attacker
+        self.table = {}
+        self._mid(INF, INF)
+        if self.stopped:
+            return None
+        return self.table[self.board.hash]
+
+    def best_move(self):
+        """
+        Return a move of the player to move that succeeds,
+        after a prove that succeeded for it
+        """
+        color = self.board.current_player
+        moves = self._moves()
+        if self.threats.wins[color]:
+            return moves[0]
+        zobrist = self.board.zobrist[color]
+        for move in moves:
+            entry = self.table.get(self.board.hash ^ zobrist[move])
+            if entry is not None and entry[1] == 0:
+                return move
+        return None
+
+    def _terminal(self):
+        """
+        Return (phi, delta) of the current position if it is decided
+        without search, else None
+        """
+        board = self.board
+        threats = self.threats
+        color = board.current_player
+        if board.winner is not None:
+            return INF, 0
+        if not threats.empties:
+            if color == self.attacker:
+                return INF, 0
+            return 0, INF
+        if threats.wins[color]:
+            return 0, INF
+        if len(threats.wins[GoBoardUtil.opponent(color)]) > 1:
+            # the opponent has two win points, only one can be blocked
+            return INF, 0
+        return None
+
+    def _moves(self):
+        """
+        Return the moves to search in the current position, see above
+        """
+        threats = self.threats
+        color = self.board.current_player
+        opponent = GoBoardUtil.opponent(color)
+        if threats.wins[color]:
+            return list(threats.wins[color])[:1]
+        if threats.wins[opponent]:
+            return list(threats.wins[opponent])
+        fours = threats.four_moves(color)
+        blocks = threats.open_four_blocks(opponent)
+        if blocks is not None:
+            return self._ordered(list(fours | blocks), color, fours)
+        return self._ordered(list(threats.empties), color, fours)
+
+    def _ordered(self, moves, color, fours):
+        """
+        Sort moves: open-four points of color first, then its fours, then the
+        open-four points of the opponent, then the others, each group by
+        decreasing number of neighbouring stones.
+        fours: the moves that make a four for color
+        """
+        threats = self.threats
+        opponent = GoBoardUtil.opponent(color)
+        cells = threats.cells
+        NS = self.board.NS
+        offsets = (1, -1, NS, -NS, NS + 1, -NS - 1, NS - 1, -NS + 1)
+
+        def key(move):
+            if move in threats.fours[color]:
+                group = 0
+            elif move in fours:
+                group = 1
+            elif move in threats.fours[opponent]:
+                group = 2
+            else:
+                group = 3
+            stones = 0
+            for offset in offsets:
+                neighbour = cells[move + offset]
+                if neighbour == BLACK or neighbour == WHITE:
+                    stones += 1
+            return group, -stones, move
+
+        moves.sort(key = key)
+        return moves
+
+    def _mid(self, thphi, thdelta):
+        """
+        Search the current position until its phi reaches thphi
+        or its delta reaches thdelta, and store its numbers
+        """
+        board = self.board
+        table = self.table
+        key = board.hash
+        self.nodes += 1
+        if self.stop_token is not None and self.nodes % CHECK_NODES == 0 \
+            and self.stop_token.stopped():
+            self.stopped = True
+        if self.stopped:
+            return
+        value = self._terminal()
+        if value is not None:
+            table[key] = value
+            return
+        color = board.current_player
+        zobrist = board.zobrist[color]
+        moves = self._moves()
+        while True:
+            phi = INF
+            delta = 0
+            delta2 = INF
+            best = None
+            best_phi = 0
+            for move in moves:
+                child_phi, child_delta = table.get(key ^ zobrist[move], (1, 1))
+                delta += child_phi
+                if child_delta < phi:
+                    delta2 = phi
+                    phi = child_delta
+                    best = move
+                    best_phi = child_phi
+                elif child_delta < delta2:
+                    delta2 = child_delta
+            if delta > INF:
+                delta = INF
+            if phi >= thphi or delta >= thdelta:
+                table[key] = (phi, delta)
+                return
+            child_thphi = min(thdelta - delta + best_phi, INF)
+            child_thdelta = min(thphi, delta2 + 1)
+            board.play_move_gomoku(best, color)
+            self.threats.play(best, color)
+            self._mid(child_thphi, child_thdelta)
+            self.threats.undo(best, color)
+            board.undo_move_gomoku()
+            if self.stopped:
+                return
+
+def solve(board, stop_token = None):
+    """
+    Solve the current position of board, with the same results as
+    alphabeta.solve, as used by SimpleGoBoard.solve:
+    (result, "First", drawMove) if the game is over, result being 0 for a draw
+    (True, move, None) if the player to move wins by move
+    (True, "NoMove", drawMove) if it can draw, by drawMove
+    (False, "NoMove", None) if it loses
+    or None if stop_token, a StopToken, stopped the search before
+    """
+    game_end, winner = board.check_game_end_gomoku()
+    if game_end:
+        return (1 if winner == board.current_player else -1), "First", None
+    if len(board.get_empty_points()) == 0:
+        return 0, "First", "NoMove"
+    solver = DfpnSolver(board, stop_token)
+    color = board.current_player
+    line = ThreatSearch(board, solver.threats).find_win(color)
+    if line:
+        return True, line[0], None
+    numbers = solver.prove(color)
+    if numbers is None:
+        return None
+    if numbers[0] == 0:
+        return True, solver.best_move(), None
+    numbers = solver.prove(GoBoardUtil.opponent(color))
+    if numbers is None:
+        return None
+    if numbers[0] == 0:
+        return True, "NoMove", solver.best_move()
+    return False, "NoMove", None
@@ -10,13 +10,16 @@ import traceback
 from sys import stdin, stdout, stderr
 from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, PASS, \
                        MAXSIZE, coord_to_point
+from bit_board import BitGoBoard
 import numpy as np
 import re
-import signal
+from time_manager import TimeManager
+from ponder import Ponderer
 
 class GtpConnection():
 
-    def __init__(self, go_engine, board, debug_mode = False):
+    def __init__(self, go_engine, board, debug_mode = False, use_bitboard = False,
+                 ponder = False):
         """
         Manage a GTP connection for a Go-playing engine
 
@@ -26,11 +29,17 @@ class GtpConnection():
             a program that can reply to a set of GTP commandsbelow
         board: 
             Represents the current board state.
+        use_bitboard:
+            replace board by a BitGoBoard of the same size
+        ponder:
+            search on the opponent's time with go_engine.ponder,
+            see ponder.py
         """
         self._debug_mode = debug_mode
         self.go_engine = go_engine
+        if use_bitboard and not isinstance(board, BitGoBoard):
+            board = BitGoBoard(board.size)
         self.board = board
-        signal.signal(signal.SIGALRM, self.handler)
         self.commands = {
             "protocol_version": self.protocol_version_cmd,
             "quit": self.quit_cmd,
@@ -56,9 +65,14 @@ class GtpConnection():
             "solve": self.solve_cmd,
             "list_solve_point": self.list_solve_point_cmd, # below is added for Gomoku3
             "policy": self.set_playout_policy, 
-            "policy_moves": self.display_pattern_moves
+            "policy_moves": self.display_pattern_moves,
+            "tt_stats": self.tt_stats_cmd,
+            "search_stats": self.search_stats_cmd,
+            "ponder": self.ponder_cmd
         }
         self.timelimit=60
+        self.ponder = ponder
+        self.ponderer = Ponderer()
 
         # used for argument checking
         # values: (required number of arguments, 
@@ -70,7 +84,8 @@ class GtpConnection():
             "genmove": (1, 'Usage: genmove {w,b}'),
             "play": (2, 'Usage: play {b,w} MOVE'),
             "legal_moves": (1, 'Usage: legal_moves {w,b}'),
-            "policy":(1, 'Usage: set playout policy {random, rule_based}')
+            "policy":(1, 'Usage: set playout policy {random, rule_based}'),
+            "ponder": (1, 'Usage: ponder {on,off}')
         }
     
     def set_playout_policy(self, args):
@@ -114,6 +129,7 @@ class GtpConnection():
         while line:
             self.get_cmd(line)
             line = stdin.readline()
+        self.ponderer.stop()
 
     def get_cmd(self, command):
         """
@@ -131,6 +147,8 @@ class GtpConnection():
         if not elements:
             return
         command_name = elements[0]; args = elements[1:]
+        # the commands use the board, the search on it must be done
+        self.ponderer.stop()
         if self.has_arg_error(command_name, len(args)):
             return
         if command_name in self.commands:
@@ -280,21 +298,37 @@ class GtpConnection():
         except Exception as e:
             self.respond('{}'.format(str(e)))
 
+    def ponder_cmd(self, args):
+        """ Turn the search on the opponent's time on or off """
+        if args[0] not in ('on', 'off'):
+            self.error(self.argmap['ponder'][1])
+            return
+        self.ponder = (args[0] == 'on')
+        self.respond()
+
+    def start_pondering(self, color):
+        """
+        Search on the opponent's time after the genmove of color,
+        until the next command
+        """
+        if not self.ponder:
+            return
+        game_end, _ = self.board.check_game_end_gomoku()
+        if game_end or len(self.board.get_empty_points()) == 0:
+            return
+        self.ponderer.start(self.go_engine.ponder, self.board, color)
+
     def timelimit_cmd(self, args):
         self.timelimit = args[0]
+        self.go_engine.timelimit = int(args[0])
         self.respond('')
 
-    def handler(self, signum, fram):
-        self.board = self.sboard
-        raise Exception("unknown")
-
     def solve_cmd(self, args):
         try:
-            self.sboard = self.board.copy()
-            signal.alarm(int(self.timelimit)-1)
-            winner,move = self.board.solve()
-            self.board = self.sboard
-            signal.alarm(0)
+            # the solver stops at the time limit, and undoes its moves
+            time_manager = TimeManager(int(self.timelimit),
+                len(self.board.get_empty_points()), self.board.size)
+            winner,move = self.board.solve(time_manager.token)
             if move != "NoMove":
                 if move == None:
                     self.respond('{} {}'.format(winner, self.board._point_to_coord(move)))
@@ -323,18 +357,10 @@ class GtpConnection():
         if board_is_full:
             self.respond("pass")
             return
-        move=None
-        try:
-            signal.alarm(int(self.timelimit))
-            self.sboard = self.board.copy()
-            # print("before genmove, twoDBoard = {}".format(self.board.twoDBoard))
-            move = self.go_engine.get_move(self.board, color)
-            self.board=self.sboard
-            signal.alarm(0)
-        except Exception as e:
-            # move=self.go_engine.best_move
-            row, col = self.board.board_searcher.bestmove
-            move = self.board.twoD_coord_to_point(row, col)
+        # the engine stops at the hard deadline of its TimeManager,
+        # and leaves the board as it was
+        # print("before genmove, twoDBoard = {}".format(self.board.twoDBoard))
+        move = self.go_engine.get_move(self.board, color)
 
         if move == PASS:
             self.respond("pass")
@@ -344,6 +370,7 @@ class GtpConnection():
         if self.board.is_legal_gomoku(move, color):
             self.board.play_move_gomoku(move, color)
             self.respond(move_as_string)
+            self.start_pondering(color)
         else:
             self.respond("illegal move: {}".format(move_as_string))
 
@@ -426,6 +453,15 @@ class GtpConnection():
     def list_solve_point_cmd(self, args):
         self.respond(self.board.list_solve_point())
 
+    def tt_stats_cmd(self, args):
+        """ Report hit/miss/collision counters of the searcher's transposition table """
+        self.respond(self.board.board_searcher.tt.stats())
+
+    def search_stats_cmd(self, args):
+        """ Report the nodes and cutoff rates per ply of the last genmove search """
+        searcher = self.go_engine.searcher
+        self.respond(searcher.stats() if searcher is not None else '')
+
 def point_to_coord(point, boardsize):
     """
     Transform point given as board array index 
@@ -0,0 +1,179 @@
+'''
+	Define an IncrementalEvaluator class.
+	It returns the same scores as BoardEvaluator, but keeps the shape counts
+	(five, four, cFour, three, cThree, two, cTwo) of every line on the board,
+	and only re-classifies the four lines through a point that changed.
+	A line is classified by one lookup of its code (see line_patterns.py)
+	in a table built once from BoardEvaluator.analysis_line.
+	See test_incremental_evaluator.py for the comparison with BoardEvaluator.
+'''
+from board_evaluator import BoardEvaluator
+from line_patterns import encode, build_table
+
+
+class IncrementalEvaluator(BoardEvaluator):
+
+	# shape_tables[(length, upwards)][code] = list of (stone, situation)
+	# of the stones on a line of that length, shared by all instances
+	# and built on first use
+	shape_tables = None
+
+	def __init__ (self):
+		BoardEvaluator.__init__(self)
+		# self.lines[n] = (cells, upwards) for every line of length >= 5
+		# cells: (row, col) of the line, in the order BoardEvaluator reads it
+		# upwards: True if BoardEvaluator visits its stones from the last
+		#		cell to the first one (right-hand diagonals, read with row
+		#		decreasing but visited row by row)
+		# self.line_of[row][col] = list of (index, k): cell k of line index,
+		# for the lines of length >= 5 through (row, col)
+		self.lines = []
+		self.line_of = [ [ [] for j in range(7) ] for i in range(7) ]
+		for i in range(7):
+			self.__add_line([ (i, x) for x in range(7) ], False)
+			self.__add_line([ (x, i) for x in range(7) ], False)
+		for start in range(-6, 7):
+			# left-hand diagonal: row - col == start
+			cells = [ (r, r - start) for r in range(7) if 0 <= r - start < 7 ]
+			self.__add_line(cells, False)
+			# right-hand diagonal: row + col == start + 6, read with row decreasing
+			s = start + 6
+			cells = [ (r, s - r) for r in range(6, -1, -1) if 0 <= s - r < 7 ]
+			self.__add_line(cells, True)
+		self.check = (self.five, self.four, self.cFour, self.three,
+					self.cThree, self.two, self.cTwo)
+		# weight of each situation in move_threat, 0 for the shapes
+		# that do not threaten to make a five
+		self.threat_weights = [ 0 ] * 10
+		self.threat_weights[self.five] = 100000
+		self.threat_weights[self.four] = 10000
+		self.threat_weights[self.cFour] = 1000
+		self.threat_weights[self.three] = 1000
+		if IncrementalEvaluator.shape_tables is None:
+			tables = {}
+			for length in (5, 6, 7):
+				for upwards in (False, True):
+					tables[(length, upwards)] = build_table(length,
+						lambda values: self.line_shapes(values, upwards))
+			IncrementalEvaluator.shape_tables = tables
+		self.board = None
+
+
+	def __add_line (self, cells, upwards):
+		if len(cells) < 5:
+			return
+		index = len(self.lines)
+		self.lines.append((cells, upwards))
+		for k in range(len(cells)):
+			r, c = cells[k]
+			self.line_of[r][c].append((index, k))
+
+
+	# analyze one line exactly as BoardEvaluator.count_shapes does,
+	# return the list of (stone, situation) of the stones found on it
+	def line_shapes (self, values, upwards):
+		line = self.line
+		result = self.result
+		unanalyzed = self.unanalyzed
+		num = len(values)
+		if upwards:
+			order = range(num - 1, -1, -1)
+		else:
+			order = range(num)
+		record = [ unanalyzed ] * num
+		for k in order:
+			if values[k] != 0 and record[k] == unanalyzed:
+				for x in range(num):
+					line[x] = values[x]
+				self.analysis_line(line, result, num, k)
+				for x in range(num):
+					if result[x] != unanalyzed:
+						record[x] = result[x]
+		check = self.check
+		return [ (values[k], record[k]) for k in range(num)
+				if values[k] != 0 and record[k] in check ]
+
+
+	# start tracking board, a 7x7 list of lists
+	def set_board (self, board):
+		self.board = board
+		self.cells = [ row[:] for row in board ]
+		self.totals = [ [ 0 ] * 10 for i in range(3) ]
+		self.weights = [ 0, 0, 0 ]
+		for i in range(7):
+			for j in range(7):
+				if board[i][j] != 0:
+					self.weights[board[i][j]] += self.POS[i][j]
+		# per line: its code, its lookup table and the shapes found on it
+		self.codes = []
+		self.tables = []
+		self.shapes = []
+		for cells, upwards in self.lines:
+			code = encode([ board[r][c] for r, c in cells ])
+			table = self.shape_tables[(len(cells), upwards)]
+			shapes = table[code]
+			self.codes.append(code)
+			self.tables.append(table)
+			self.shapes.append(shapes)
+			for stone, ch in shapes:
+				self.totals[stone][ch] += 1
+
+
+	# board[row][col] was played or undone, re-classify the lines through it
+	def update (self, row, col):
+		old = self.cells[row][col]
+		new = self.board[row][col]
+		if old == new:
+			return
+		self.cells[row][col] = new
+		weights = self.weights
+		weights[old] -= self.POS[row][col]
+		weights[new] += self.POS[row][col]
+		weights[0] = 0
+		totals = self.totals
+		codes = self.codes
+		for index, k in self.line_of[row][col]:
+			for stone, ch in self.shapes[index]:
+				totals[stone][ch] -= 1
+			code = codes[index] + ((new - old) << (2 * k))
+			codes[index] = code
+			shapes = self.tables[index][code]
+			self.shapes[index] = shapes
+			for stone, ch in shapes:
+				totals[stone][ch] += 1
+
+
+	# return the threat value of a stone of turn on the empty point (row, col):
+	# the weights of the threats it makes, plus the weights of the threats
+	# of the opponent it breaks, from the shapes of the lines through it
+	def move_threat (self, row, col, turn):
+		weights = self.threat_weights
+		codes = self.codes
+		tables = self.tables
+		score = 0
+		for index, k in self.line_of[row][col]:
+			for stone, ch in self.shapes[index]:
+				if stone == turn:
+					score -= weights[ch]
+				else:
+					score += weights[ch]
+			for stone, ch in tables[index][codes[index] + (turn << (2 * k))]:
+				if stone == turn:
+					score += weights[ch]
+				else:
+					score -= weights[ch]
+		return score
+
+
+	# load the tracked counts instead of analyzing the whole board
+	def count_shapes (self, board):
+		if board is not self.board:
+			self.set_board(board)
+		count = self.count
+		totals = self.totals
+		for i in range(10):
+			count[0][i] = 0
+			count[1][i] = totals[1][i]
+			count[2][i] = totals[2][i]
+		self.weight = self.weights
+
@@ -0,0 +1,71 @@
+"""
+line_patterns.py
+
+Precomputed lookup tables that classify a line segment with one integer lookup.
+
+A segment of cells is encoded with two bits per cell, the first cell in the
+lowest bits. The cell values are the board colors of board_util:
+EMPTY = 0, BLACK = 1, WHITE = 2, BORDER = 3
+so a segment read from SimpleGoBoard.board or from a twoDBoard can be encoded
+directly, and updated in place when one of its cells changes:
+    code += (new_color - old_color) << (2 * index)
+The same module is copied in every player that uses it.
+"""
+
+from itertools import product
+import numpy as np
+from board_util import GoBoardUtil, EMPTY, BLACK, WHITE, BORDER
+
+def encode(values):
+    """
+    Return the code of the segment values[0], values[1], ...
+    """
+    code = 0
+    for value in reversed(values):
+        code = code << 2 | value
+    return code
+
+def build_table(length, classify, symbols = (EMPTY, BLACK, WHITE)):
+    """
+    Return a list table with table[encode(values)] = classify(values)
+    for every segment of length cells with values in symbols.
+    Entries of codes that use other values are None.
+    """
+    table = [None] * (1 << (2 * length))
+    for values in product(symbols, repeat = length):
+        table[encode(values)] = classify(list(values))
+    return table
+
+def build_pattern_tables(pattern_list, color):
+    """
+    Compile the string patterns used by SimpleGoBoard.get_pattern_moves
+    for the player color.
+    pattern_list[category] maps a pattern string over
+    'x' (color), 'o' (opponent), '.' (empty) and 'B' (border)
+    to the set of offsets of its moves, counted back from the last cell.
+    Return a dict tables[length][code] = (category, offsets),
+    with the offsets counted from the first cell.
+    If a segment matches patterns of several categories, the first one is kept.
+    """
+    symbol = {'x': color, 'o': GoBoardUtil.opponent(color),
+              '.': EMPTY, 'B': BORDER}
+    tables = {}
+    for category, patterns in enumerate(pattern_list):
+        for pattern, offsets in patterns.items():
+            code = encode([symbol[c] for c in pattern])
+            table = tables.setdefault(len(pattern), {})
+            if code not in table:
+                table[code] = (category, tuple(sorted(
+                    len(pattern) - 1 - offset for offset in offsets)))
+    return tables
+
+def category_array(table, length):
+    """
+    Return an array categories[code] = category of code in a table of
+    build_pattern_tables, or -1 if code matches no pattern,
+    to classify many segments of length cells at once.
+    """
+    categories = np.full(1 << (2 * length), -1, dtype = np.int32)
+    for code, (category, offsets) in table.items():
+        categories[code] = category
+    return categories
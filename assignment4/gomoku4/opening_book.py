@@ -0,0 +1,138 @@
+"""
+opening_book.py
+
+Opening book of gomoku: the move to play in every position of the first
+plies, found offline by a deep search.
+
+Positions are keyed by the smallest Zobrist hash of the 8 symmetric images
+of the position, marked with the player to move, so the book holds one
+entry per symmetry class. The board keeps the 8 hashes up to date on
+every move (see SimpleGoBoard.canonical_key), so a probe costs no rehashing.
+
+File format, little-endian:
+    header   HEADER  magic, board size, plies, number of records
+    records  RECORD  key, move, sorted by key
+move: the move to play, as a point of the canonical image of the position
+
+The file is read once at startup and searched by bisection.
+
+Build: python opening_book.py [plies [seconds [path]]]
+"""
+
+import os
+import struct
+import sys
+import time
+from board_util import EMPTY, WHITE, symmetry_table, INVERSE_SYMMETRY
+
+HEADER = struct.Struct('<4sIII')
+RECORD = struct.Struct('<QB')
+MAGIC = b'GOBK'
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening.book')
+BOOK_PLIES = 3
+
+def book_key(board):
+    """
+    Return (key, s): the key of the position of board, its canonical key
+    marked with the player to move, and the symmetry s that maps the
+    position to its canonical image.
+    The EMPTY row of the Zobrist table is not used for stones,
+    its key on the border point 0 marks white to move.
+    """
+    key, s = board.canonical_key()
+    if board.current_player == WHITE:
+        key ^= board.zobrist[EMPTY][0]
+    return key, s
+
+class OpeningBook(object):
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        magic, self.size, self.plies, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not an opening book".format(path))
+
+    def lookup(self, key):
+        """
+        Return the move of the record of key, or None
+        """
+        data = self.data
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            record_key, move = RECORD.unpack_from(data, HEADER.size + middle * RECORD.size)
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return move
+        return None
+
+    def probe(self, board):
+        """
+        Return the book move of the player to move on board,
+        as a point of board, or None if the position is not in the book
+        """
+        if board.size != self.size or len(board.moves) >= self.plies:
+            return None
+        key, s = book_key(board)
+        move = self.lookup(key)
+        if move is None:
+            return None
+        return symmetry_table(board.size)[INVERSE_SYMMETRY[s]][move]
+
+"""
+Books opened by open_book, by path
+"""
+_books = {}
+
+def open_book(path = DEFAULT_PATH):
+    """
+    Return the OpeningBook of path, read once, or None if there is none
+    """
+    if path not in _books:
+        if os.path.exists(path):
+            _books[path] = OpeningBook(path)
+        else:
+            _books[path] = None
+    return _books[path]
+
+def build(path = DEFAULT_PATH, plies = BOOK_PLIES, seconds = 2.0, size = 7):
+    """
+    Search every position of the first plies plies, one per symmetry class,
+    for seconds each with BoardSearcher, and write the book to path
+    """
+    from simple_board import SimpleGoBoard
+    board = SimpleGoBoard(size)
+    entries = {}
+
+    def visit():
+        key, s = book_key(board)
+        if key in entries or board.winner is not None:
+            return
+        color = board.current_player
+        _, row, col = board.board_searcher.search(board.twoDBoard, color,
+            len(board.get_empty_points()), time.time() + seconds)
+        move = board.twoD_coord_to_point(row, col)
+        entries[key] = symmetry_table(size)[s][move]
+        if len(board.moves) + 1 < plies:
+            for point in board.get_empty_points():
+                board.play_move_gomoku(point, color)
+                visit()
+                board.undo_move_gomoku()
+
+    visit()
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, size, plies, len(entries)))
+        for key in sorted(entries):
+            f.write(RECORD.pack(key, entries[key]))
+    return len(entries)
+
+if __name__ == '__main__':
+    plies = int(sys.argv[1]) if len(sys.argv) > 1 else BOOK_PLIES
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+    path = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_PATH
+    print("{} positions written to {}".format(build(path, plies, seconds), path))
@@ -0,0 +1,50 @@
+"""
+ponder.py
+
+Search on the opponent's time.
+
+After answering genmove, the GTP connection gives the position to a
+Ponderer, which runs the ponder function of the engine in a background
+thread while the connection waits for the next command. The thread gets a
+StopToken (see time_manager.py): before running any command, the connection
+stops it and waits for the search to undo its moves and return, so the
+commands never run during a search. What the search found is kept by the
+engine for its next genmove: the subtree of the opponent's move, the
+transposition table entries or the solved positions.
+
+The thread mostly runs while the main thread is blocked reading stdin,
+which releases the interpreter lock.
+"""
+
+import threading
+from time_manager import StopToken
+
+class Ponderer(object):
+
+    def __init__(self):
+        self.thread = None
+        self.token = None
+
+    def start(self, ponder, *args):
+        """
+        Stop the current search, and run ponder(*args, stop_token)
+        in a background thread
+        """
+        self.stop()
+        self.token = StopToken()
+        self.thread = threading.Thread(target = ponder, args = args + (self.token,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop the search, and wait until it has returned
+        """
+        if self.thread is not None:
+            self.token.stop()
+            self.thread.join()
+            self.thread = None
+            self.token = None
+
+    def pondering(self):
+        return self.thread is not None and self.thread.is_alive()
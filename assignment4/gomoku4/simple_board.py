@@ -12,9 +12,42 @@ The board uses a 1-dimensional representation with padding
 import numpy as np
 from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, \
                        PASS, is_black_white, coord_to_point, where1d, \
-                       MAXSIZE, NULLPOINT
-import alphabeta
+                       MAXSIZE, NULLPOINT, zobrist_table, \
+                       symmetric_zobrist_table, \
+                       CANDIDATE_RADIUS, neighbourhood_masks
+import dfpn
 from board_searcher import BoardSearcher
+from transposition_table import TranspositionTable
+from line_patterns import build_pattern_tables, category_array
+
+"""
+Patterns of get_pattern_moves and list_solve_point, one dict per move type:
+win, block win, make-four, block-open-four.
+'x' is the player to move, 'o' the opponent, '.' empty and 'B' the border.
+Each pattern maps to the offsets of its moves, counted back from its last point.
+"""
+PATTERN_MOVES_PATTERNS = [
+    {'xxxx.':{0},'xxx.x':{1},'xx.xx':{2},'x.xxx':{3},'.xxxx':{4}}, #win
+    {'oooo.':{0},'ooo.o':{1},'oo.oo':{2},'o.ooo':{3},'.oooo':{4}}, #block win
+    {'.xxx..':{1},'..xxx.':{4},'.xx.x.':{2},'.x.xx.':{3}}, #make-four
+    {'.ooo..':{1,5},'..ooo.':{0,4},'.oo.o.':{0,2,5},'.o.oo.':{0,3,5}, 'B.ooo..':{0}, '..ooo.B':{6},
+     'x.ooo..':{0}, '..ooo.x':{6} #block-open-four
+     }]
+
+SOLVE_POINT_PATTERNS = [
+    {'xxxx.':{0},'xxx.x':{1},'xx.xx':{2},'x.xxx':{3},'.xxxx':{4}},
+    {'oooo.':{0},'ooo.o':{1},'oo.oo':{2},'o.ooo':{3},'.oooo':{4}},
+    {'.xxx..':{1},'..xxx.':{4},'.xx.x.':{2},'.x.xx.':{3}},
+    {'.ooo..':{1,5},'..ooo.':{0,4},'.oo.o.':{2},'.o.oo.':{3}}]
+
+"""
+Compiled patterns, _pattern_tables[(id(pattern_list), color)] is the list of
+(length, categories, table) of the patterns of each length, see line_patterns.py.
+Segments scanned for patterns, _segments[(size, on_board_starts)],
+see SimpleGoBoard._build_segments.
+"""
+_pattern_tables = {}
+_segments = {}
 
 class SimpleGoBoard(object):
 
@@ -90,22 +123,104 @@ class SimpleGoBoard(object):
         self._initialize_neighbors()
         self.twoDBoard = [ [ 0 for _ in range(self.size) ] for _ in range(self.size) ]
         # self.to_twoD()
-        self.board_searcher = BoardSearcher()
-        self.board_searcher.board = self.twoDBoard
         self.moves = []
+        # gomoku winner so far, kept up to date by play/undo
+        self.winner = None
+        # mask of the points within candidate_radius of a stone, and its
+        # value before each move, kept up to date by play/undo
+        self.candidate_radius = CANDIDATE_RADIUS
+        self._neighbourhood = neighbourhood_masks(size, self.candidate_radius)
+        self.near_bits = 0
+        self._near_stack = []
+        # Zobrist hash of the stones on the board, kept up to date by play/undo
+        self.zobrist = zobrist_table(self.maxpoint)
+        self.hash = 0
+        # Zobrist hashes of the 8 symmetric images of the position,
+        # see board_util.symmetry_table, kept up to date by play/undo
+        self.symmetric_zobrist = symmetric_zobrist_table(size)
+        self.hashes = (0,) * 8
+        self._board_searcher = None
+        self._tt = None
         self.maxdepth = 2
 
+    @property
+    def board_searcher(self):
+        """
+        The BoardSearcher of this board, created on first use
+        """
+        if self._board_searcher is None:
+            self._board_searcher = BoardSearcher(self, self.transposition_table())
+        return self._board_searcher
+
+    def transposition_table(self):
+        """
+        The transposition table of this board and of its copies
+        """
+        if self._tt is None:
+            self._tt = TranspositionTable()
+        return self._tt
+
     def copy(self):
-        b = SimpleGoBoard(self.size)
-        assert b.NS == self.NS
-        assert b.WE == self.WE
-        b.ko_recapture = self.ko_recapture
-        b.current_player = self.current_player
-        assert b.maxpoint == self.maxpoint
+        """
+        Copy the position without resetting a new board:
+        the tables that only depend on the size (neighbors, Zobrist keys)
+        and the transposition table are shared,
+        and the searcher of the copy is created on first use.
+        """
+        self.transposition_table()
+        b = SimpleGoBoard.__new__(SimpleGoBoard)
+        b.__dict__.update(self.__dict__)
+        self._copy_position_to(b)
         b.board = np.copy(self.board)
-        b.twoDBoard = self.twoDBoard.copy()
         return b
 
+    def _copy_position_to(self, b):
+        """
+        Give b its own copy of the mutable state of this board,
+        except the stones of self.board
+        """
+        b.liberty_of = np.copy(self.liberty_of)
+        b.twoDBoard = [row[:] for row in self.twoDBoard]
+        b.moves = list(self.moves)
+        b._near_stack = list(self._near_stack)
+        b._board_searcher = None
+
+    def set_candidate_radius(self, radius):
+        """
+        Set the Chebyshev distance to a stone of the candidate moves
+        """
+        self.candidate_radius = radius
+        self._neighbourhood = neighbourhood_masks(self.size, radius)
+        self.near_bits = 0
+        self._near_stack = []
+        for move in self.moves:
+            self._near_stack.append(self.near_bits)
+            self.near_bits |= self._neighbourhood[move[0]]
+
+    def get_candidate_moves(self):
+        """
+        Return:
+            The empty points within candidate_radius of a stone,
+            or all the empty points if there is no stone
+        """
+        if not self.moves:
+            return self.get_empty_points()
+        board = self.board
+        return np.array([point for point in self._bit_points(self.near_bits)
+                         if board[point] == EMPTY], dtype = np.int64)
+
+    @staticmethod
+    def _bit_points(bits):
+        """
+        Return the list of points whose bit is set in bits
+        """
+        points = []
+        while bits:
+            low = bits & -bits
+            points.append(low.bit_length() - 1)
+            bits ^= low
+        return points
+
     def row_start(self, row):
         assert row >= 1
         assert row <= self.size
@@ -368,17 +483,44 @@ class SimpleGoBoard(object):
         # print("play_move_gomoku: row = {}, col = {}".format(row, col))
         self.twoDBoard[row][col] = color
         # print("twoDBoard = {}".format(self.twoDBoard))
-        self.moves.append((point, color))
+        self.moves.append((point, color, self.winner))
+        self._near_stack.append(self.near_bits)
+        self.near_bits |= self._neighbourhood[point]
+        self.hash ^= self.zobrist[color][point]
+        self._update_hashes(point, color)
+        if self.winner is None and self.point_check_game_end_gomoku(point):
+            self.winner = color
         self.current_player = GoBoardUtil.opponent(color)
         return True
 
     def undo_move_gomoku(self):
-        last_move, last_color = self.moves.pop()
+        last_move, last_color, self.winner = self.moves.pop()
+        self.near_bits = self._near_stack.pop()
+        self.hash ^= self.zobrist[last_color][last_move]
+        self._update_hashes(last_move, last_color)
         self.board[last_move] = EMPTY
         row, col = self._point_to_2d_coord(last_move)
         self.twoDBoard[row][col] = EMPTY
         self.current_player = GoBoardUtil.opponent(self.current_player)
         
+    def _update_hashes(self, point, color):
+        keys = self.symmetric_zobrist[color][point]
+        h = self.hashes
+        self.hashes = (h[0] ^ keys[0], h[1] ^ keys[1], h[2] ^ keys[2], h[3] ^ keys[3],
+                       h[4] ^ keys[4], h[5] ^ keys[5], h[6] ^ keys[6], h[7] ^ keys[7])
+
+    def canonical_key(self):
+        """
+        Return (key, s): the smallest of the hashes of the 8 symmetric
+        images of the position, and the symmetry s of that image.
+        Symmetric positions have the same key; a point of the position
+        is the point symmetry_table(size)[s][point] of the canonical image,
+        and INVERSE_SYMMETRY[s] maps the canonical image back.
+        """
+        h = self.hashes
+        s = h.index(min(h))
+        return h[s], s
+
     def _point_direction_check_connect_gomoko(self, point, shift):
         """
         Check if the point has connect5 condition in a direction
@@ -396,6 +538,9 @@ class SimpleGoBoard(object):
                     break
             else:
                 break
+        if count == 5:
+            # an overline would count more than 5 in the other direction
+            return True
         d = -d
         p = point
         while True:
@@ -434,18 +579,11 @@ class SimpleGoBoard(object):
     def check_game_end_gomoku(self):
         """
             Check if the game ends for the game of Gomoku.
+            The winner is updated by play_move_gomoku and undo_move_gomoku,
+            from the four lines through the last move only.
             """
-        white_points = where1d(self.board == WHITE)
-        black_points = where1d(self.board == BLACK)
-        
-        for point in white_points:
-            if self.point_check_game_end_gomoku(point):
-                return True, WHITE
-    
-        for point in black_points:
-            if self.point_check_game_end_gomoku(point):
-                return True, BLACK
-
+        if self.winner is not None:
+            return True, self.winner
         return False, None
 
     def to_twoD(self):
@@ -458,8 +596,16 @@ class SimpleGoBoard(object):
         is_end, _ = self.check_game_end_gomoku()
         return is_end or len(self.get_empty_points()) == 0
 
-    def solve(self):
-        result, move, drawMove = alphabeta.solve(self)
+    def solve(self, stop_token=None):
+        """
+        Solve the position for the player to move, see dfpn.solve.
+        Return (winner, move), ('unknown', 'NoMove') if stop_token,
+        a StopToken, stopped the solver first.
+        """
+        solution = dfpn.solve(self, stop_token)
+        if solution is None:
+            return 'unknown', 'NoMove'
+        result, move, drawMove = solution
         if move=="First":
             if result==0:
                 return 'draw',drawMove
@@ -476,29 +622,63 @@ class SimpleGoBoard(object):
             winner='w' if self.current_player==WHITE else 'b'
             return winner, move
 
-    def check_pattern(self,point,have,direction_x,direction_y,moveSet,patternList,color,flag):
-        for i in range(0,4):
-            if have in patternList[i]:
-                for dis in patternList[i][have]:
-                    moveSet[i].add(point-direction_x*(dis+1)-direction_y*self.NS*(dis+1))
-                #flag[0]=True
-                break
-        if (not (0<= point<len(self.board))) or len(have)==9:
-            return
-#if self.get_color(point)==BORDER or len(have)==7:
-#            return
-        piece=self.get_color(point)
-        if piece==EMPTY:
-            piece='.'
-        elif piece==color:
-            piece='x'
-        elif piece == BORDER:
-            piece='B'
+    def _pattern_move_sets(self, pattern_list, on_board_starts):
+        """
+        Match the segments of 5 to 7 points in the 4 directions against
+        pattern_list for the current player, all segments of one length at once:
+        the codes of the segments (see line_patterns.py) are computed with one
+        matrix product, and classified with one lookup in an array of categories.
+        Segments start anywhere on the array, or only on the board if on_board_starts.
+        Returns the set of moves found for each move type.
+        """
+        color = self.current_player
+        key = (id(pattern_list), color)
+        if key not in _pattern_tables:
+            tables = build_pattern_tables(pattern_list, color)
+            _pattern_tables[key] = [(length, category_array(table, length), table)
+                                    for length, table in sorted(tables.items())]
+        key = (self.size, on_board_starts)
+        if key not in _segments:
+            _segments[key] = self._build_segments(on_board_starts, 
+                                                  max(len(p) for patterns in pattern_list 
+                                                      for p in patterns))
+        segments = _segments[key]
+        board = self.board
+        moveSet = [set() for _ in pattern_list]
+        for length, categories, table in _pattern_tables[(id(pattern_list), color)]:
+            points, starts, steps, weights = segments[length]
+            codes = board[points].dot(weights)
+            for i in np.nonzero(categories[codes] >= 0)[0].tolist():
+                category, offsets = table[int(codes[i])]
+                for offset in offsets:
+                    moveSet[category].add(int(starts[i] + offset * steps[i]))
+        return moveSet
+
+    def _build_segments(self, on_board_starts, max_length):
+        """
+        Return segments[length] = (points, starts, steps, weights) of all
+        segments of length points that fit in the board array, in the 4 directions.
+        points[i] are the points of segment i, which starts at starts[i] and
+        goes by steps[i]; weights[k] = 4 ** k.
+        """
+        if on_board_starts:
+            start_points = where1d(self.board != BORDER)
         else:
-            piece='o'
-        have+=piece
-        #print(GoBoardUtil.format_point(self._point_to_coord(point)),have,self.board[point])
-        self.check_pattern(point+direction_x+direction_y*self.NS,have,direction_x,direction_y,moveSet,patternList,color,flag)
+            start_points = np.arange(self.maxpoint)
+        segments = {}
+        for length in range(5, max_length + 1):
+            starts = []
+            steps = []
+            for d in (1, self.NS, self.NS + 1, self.NS - 1):
+                fit = start_points[start_points + (length - 1) * d < self.maxpoint]
+                starts.append(fit)
+                steps.append(np.full(len(fit), d))
+            starts = np.concatenate(starts)
+            steps = np.concatenate(steps)
+            points = starts[:, None] + steps[:, None] * np.arange(length)
+            weights = 4 ** np.arange(length)
+            segments[length] = (points, starts, steps, weights)
+        return segments
 
     def get_pattern_moves(self):
         """
@@ -506,26 +686,7 @@ class SimpleGoBoard(object):
         2. urgent blocking point xoooo.
         3. wining in 2 step point
         """
-        moveSet=[set(),set(),set(),set()]
-        color=self.current_player
-
-        patternList=[{'xxxx.':{0},'xxx.x':{1},'xx.xx':{2},'x.xxx':{3},'.xxxx':{4}}, #win
-                     {'oooo.':{0},'ooo.o':{1},'oo.oo':{2},'o.ooo':{3},'.oooo':{4}}, #block win
-                     {'.xxx..':{1},'..xxx.':{4},'.xx.x.':{2},'.x.xx.':{3}}, #make-four
-                     {'.ooo..':{1,5},'..ooo.':{0,4},'.oo.o.':{0,2,5},'.o.oo.':{0,3,5}, 'B.ooo..':{0}, '..ooo.B':{6},
-                     'x.ooo..':{0}, '..ooo.x':{6} #block-open-four
-                     }]
-
-        direction_x=[1,0,1,-1]
-        direction_y=[0,1,1,1]
-        flag=[False]
-
-        for point in range(0, len(self.board)):
-            if flag[0]:
-                break
-            for direction in range(0,4):
-                    self.check_pattern(point,'',direction_x[direction],direction_y[direction],moveSet,patternList,color,flag)
-        
+        moveSet = self._pattern_move_sets(PATTERN_MOVES_PATTERNS, False)
         i=0
         while i<4 and not bool(moveSet[i]): i+=1
         if i==4:
@@ -539,21 +700,7 @@ class SimpleGoBoard(object):
         2. urgent blocking point xoooo.
         3. wining in 2 step point
         """
-        moveSet=[set(),set(),set(),set()]
-        color=self.current_player
-
-        patternList=[{'xxxx.':{0},'xxx.x':{1},'xx.xx':{2},'x.xxx':{3},'.xxxx':{4}},{'oooo.':{0},'ooo.o':{1},'oo.oo':{2},'o.ooo':{3},'.oooo':{4}},{'.xxx..':{1},'..xxx.':{4},'.xx.x.':{2},'.x.xx.':{3}},{'.ooo..':{1,5},'..ooo.':{0,4},'.oo.o.':{2},'.o.oo.':{3}}]
-
-        direction_x=[1,0,1,-1]
-        direction_y=[0,1,1,1]
-        flag=[False]
-
-        for point in where1d(self.board!=BORDER):
-            if flag[0]:
-                break
-            for direction in range(0,4):
-                    self.check_pattern(point,'',direction_x[direction],direction_y[direction],moveSet,patternList,color,flag)
-        
+        moveSet = self._pattern_move_sets(SOLVE_POINT_PATTERNS, True)
         i=0
         while i<4 and not bool(moveSet[i]):
             i+=1
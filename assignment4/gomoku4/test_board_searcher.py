@@ -0,0 +1,100 @@
+"""
+test_board_searcher.py
+
+Regression tests of BoardSearcher.search on decided positions, whose score
+is recomputed by a search at depth 1 below the root: the results are the
+ones of the searcher without transposition table. Run with pytest from
+this directory.
+"""
+
+import random
+from simple_board import SimpleGoBoard
+from time_manager import StopToken
+
+# (moves from the empty board, {depth: (score, row, col)} of the searcher
+# without transposition table)
+DECIDED = [
+    ([44, 27, 46, 34, 51, 25, 11, 39, 54, 30, 45, 60, 17, 37],
+     {1: (9976, 4, 2), 2: (9976, 4, 2), 3: (9976, 4, 2)}),
+    ([35, 47, 31, 52, 63, 54, 51, 39, 30, 26, 60, 14, 20, 45, 43, 36, 44, 49,
+      9, 10, 11, 18],
+     {1: (9979, 2, 2), 2: (9979, 2, 2), 3: (9979, 2, 2)}),
+    ([37, 41, 60, 18, 22, 47, 25, 21, 62, 27, 13, 35, 57, 58, 26, 29, 61, 19, 38],
+     {1: (9977, 4, 2), 2: (9977, 4, 2), 3: (9977, 4, 2)}),
+    ([25, 30, 46, 39, 53, 9, 61, 44, 63, 33, 52, 20, 45, 50, 47, 36, 59, 43,
+      21, 28, 58, 38, 49, 60, 15, 27, 11, 35, 41, 42],
+     {1: (-9991, 3, 4), 2: (-9991, 2, 4), 3: (-9991, 2, 4)}),
+    # decided for the player to move before any move: below the root,
+    # the search stops at once
+    ([33, 59, 43, 62, 13, 38, 29, 47, 31, 10, 45, 11, 53, 20, 22, 41, 46, 42,
+      44, 17, 36, 60, 35, 9, 54, 28, 19, 49],
+     {1: (10016, 5, 1), 2: (10006, 5, 1), 3: (10006, 5, 1)}),
+]
+
+def position(moves):
+    board = SimpleGoBoard(7)
+    for point in moves:
+        board.play_move_gomoku(point, board.current_player)
+    return board
+
+def random_positions(count, seed):
+    """
+    positions of random games with 10 to 30 stones and no five
+    """
+    rng = random.Random(seed)
+    while count > 0:
+        board = SimpleGoBoard(7)
+        for n in range(rng.randint(10, 30)):
+            board.play_move_gomoku(rng.choice(list(board.get_empty_points())),
+                                   board.current_player)
+            if board.check_game_end_gomoku()[0]:
+                break
+        else:
+            count -= 1
+            yield [ int(point) for point, _, _ in board.moves ]
+
+def uncached_depth_1(moves):
+    """
+    score of a search at depth 1 of a searcher that does not use its table
+    """
+    board = position(moves)
+    searcher = board.board_searcher
+    searcher.use_tt = False
+    return searcher.search(board.twoDBoard, board.current_player, 1)[0]
+
+def test_decided_scores():
+    for moves, results in DECIDED:
+        for depth, expected in sorted(results.items()):
+            board = position(moves)
+            searcher = board.board_searcher
+            assert searcher.search(board.twoDBoard, board.current_player, depth) == expected
+
+def test_decided_scores_with_shared_table():
+    # the entries of the shallower searches must not change the result
+    for moves, results in DECIDED:
+        board = position(moves)
+        searcher = board.board_searcher
+        for depth, expected in sorted(results.items()):
+            assert searcher.search(board.twoDBoard, board.current_player, depth) == expected
+
+def test_rescore_is_depth_1_search():
+    # a decided score is the score of the depth 1 search, for fixed-depth
+    # and iterative searches, unless the root is decided before any move
+    checked = 0
+    for moves in random_positions(60, seed = 0):
+        for depth in (2, 3):
+            for stop_token in (None, StopToken()):
+                board = position(moves)
+                searcher = board.board_searcher
+                turn = board.current_player
+                score, _, _ = searcher.search(board.twoDBoard, turn, depth,
+                                              stop_token = stop_token)
+                if abs(score) <= 8000:
+                    continue
+                static = searcher.evaluator.evaluate(board.twoDBoard, turn)
+                if abs(static) >= 9999:
+                    assert score == static
+                else:
+                    assert score == uncached_depth_1(moves)
+                    checked += 1
+    assert checked > 0
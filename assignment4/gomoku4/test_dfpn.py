@@ -0,0 +1,86 @@
+"""
+test_dfpn.py
+
+Differential test of dfpn.solve against an exhaustive negamax, on random
+positions with few empty points: the results win, draw and loss must be
+the same, and the moves given by solve must achieve them.
+Run with pytest from this directory.
+"""
+
+import random
+from simple_board import SimpleGoBoard
+from dfpn import solve
+
+def negamax(board, table):
+    """
+    Return 1, 0 or -1 if the player to move wins, draws or loses,
+    searching every move; table keeps the values by board hash
+    """
+    key = board.hash
+    if key in table:
+        return table[key]
+    color = board.current_player
+    best = 0 if len(board.get_empty_points()) == 0 else -1
+    for point in board.get_empty_points():
+        board.play_move_gomoku(point, color)
+        if board.check_game_end_gomoku()[0]:
+            value = 1
+        else:
+            value = -negamax(board, table)
+        board.undo_move_gomoku()
+        if value > best:
+            best = value
+            if best == 1:
+                break
+    table[key] = best
+    return best
+
+def move_value(board, point, table):
+    """
+    value of point for the player to move, as negamax
+    """
+    board.play_move_gomoku(point, board.current_player)
+    if board.check_game_end_gomoku()[0]:
+        value = 1
+    else:
+        value = -negamax(board, table)
+    board.undo_move_gomoku()
+    return value
+
+def random_positions(count, seed):
+    """
+    positions of random games with 6 to 10 empty points and no five
+    """
+    rng = random.Random(seed)
+    while count > 0:
+        board = SimpleGoBoard(7)
+        empties = rng.randint(6, 10)
+        while len(board.get_empty_points()) > empties:
+            board.play_move_gomoku(rng.choice(list(board.get_empty_points())),
+                                   board.current_player)
+            if board.check_game_end_gomoku()[0]:
+                break
+        else:
+            count -= 1
+            yield board
+
+def test_solve_matches_negamax():
+    results = set()
+    for board in random_positions(40, seed = 0):
+        moves = list(board.moves)
+        table = {}
+        value = negamax(board, table)
+        result, move, draw_move = solve(board)
+        assert board.moves == moves
+        if result is True and move != "NoMove":
+            assert value == 1
+            assert move_value(board, move, table) == 1
+        elif result is True:
+            assert value == 0
+            assert move_value(board, draw_move, table) >= 0
+        else:
+            assert result is False
+            assert value == -1
+        results.add(value)
+    # wins, draws and losses are all checked
+    assert results == set([1, 0, -1])
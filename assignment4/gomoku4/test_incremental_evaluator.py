@@ -0,0 +1,44 @@
+"""
+test_incremental_evaluator.py
+
+Differential test of IncrementalEvaluator against BoardEvaluator on random
+positions, both for positions set up at once and for positions reached by
+play/undo. Run with pytest from this directory.
+"""
+
+import random
+from board_evaluator import BoardEvaluator
+from incremental_evaluator import IncrementalEvaluator
+
+def compare_with_board_evaluator(positions, seed):
+    rng = random.Random(seed)
+    full = BoardEvaluator()
+    incremental = IncrementalEvaluator()
+    board = [ [ 0 for j in range(7) ] for i in range(7) ]
+    incremental.set_board(board)
+    history = []
+    for n in range(positions):
+        if history and rng.random() < 0.4:
+            row, col = history.pop()
+            board[row][col] = 0
+        else:
+            empty = [ (i, j) for i in range(7) for j in range(7) if board[i][j] == 0 ]
+            if not empty:
+                continue
+            row, col = rng.choice(empty)
+            board[row][col] = rng.choice((1, 2))
+            history.append((row, col))
+        incremental.update(row, col)
+        for turn in (1, 2):
+            expected = full.evaluate(board, turn)
+            score = incremental.evaluate(board, turn)
+            assert score == expected, (board, turn, score, expected)
+        if rng.random() < 0.05:
+            board = [ row[:] for row in board ]
+            incremental.set_board(board)
+
+def test_matches_board_evaluator():
+    compare_with_board_evaluator(5000, seed = 0)
+
+def test_matches_board_evaluator_other_seed():
+    compare_with_board_evaluator(5000, seed = 1)
@@ -0,0 +1,68 @@
+"""
+test_opening_book.py
+
+Checks of the keys of the opening book: the key kept by the board is the
+key of the stones of the position, and symmetric positions get the same
+book move, up to their symmetry. Run with pytest from this directory.
+"""
+
+import random
+from simple_board import SimpleGoBoard
+from bit_board import BitGoBoard
+from board_util import EMPTY, WHITE, zobrist_table, symmetry_table
+from opening_book import book_key, open_book
+
+def key_of_stones(board):
+    """
+    (key, s) of book_key, hashing the stones of board.moves in each image
+    """
+    zobrist = zobrist_table(board.maxpoint)
+    side = zobrist[EMPTY][0] if board.current_player == WHITE else 0
+    best = None
+    for s, permutation in enumerate(symmetry_table(board.size)):
+        key = 0
+        for move in board.moves:
+            key ^= zobrist[move[1]][permutation[move[0]]]
+        if best is None or key < best[0]:
+            best = (key, s)
+    return best[0] ^ side, best[1]
+
+def test_key_matches_stones():
+    rng = random.Random(0)
+    for board_class in (SimpleGoBoard, BitGoBoard):
+        for n in range(300):
+            board = board_class(7)
+            for ply in range(rng.randint(0, 8)):
+                board.play_move_gomoku(rng.choice(list(board.get_empty_points())),
+                                       board.current_player)
+                if rng.random() < 0.2:
+                    board.undo_move_gomoku()
+            assert book_key(board) == key_of_stones(board)
+
+def test_symmetric_positions_get_symmetric_moves():
+    book = open_book()
+    if book is None:
+        return
+    rng = random.Random(1)
+    for n in range(100):
+        points = []
+        board = SimpleGoBoard(7)
+        for ply in range(rng.randint(0, book.plies - 1)):
+            point = rng.choice(list(board.get_empty_points()))
+            board.play_move_gomoku(point, board.current_player)
+            points.append(point)
+        move = book.probe(board)
+        for permutation in symmetry_table(7):
+            image = SimpleGoBoard(7)
+            for point in points:
+                image.play_move_gomoku(permutation[point], image.current_player)
+            assert book_key(image)[0] == book_key(board)[0]
+            if move is not None:
+                image_move = book.probe(image)
+                # the book move of a symmetric image is the image of a move of
+                # the same class: it maps the position to the same key
+                image.play_move_gomoku(image_move, image.current_player)
+                board.play_move_gomoku(move, board.current_player)
+                assert book_key(image)[0] == book_key(board)[0]
+                image.undo_move_gomoku()
+                board.undo_move_gomoku()
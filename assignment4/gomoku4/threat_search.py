@@ -0,0 +1,153 @@
+"""
+threat_search.py
+
+Threat-space search for forced wins of gomoku.
+
+The attacker only plays threats, so the opponent's replies are forced:
+- VCF (victory by continuous fours): every attacker move makes a four,
+  and the only reply is to block its win point.
+- VCT (victory by continuous threats): the attacker may also make an
+  open three, an open-four point. The replies are then the moves that
+  stop every open four of the attacker, and the moves that make a four
+  (see ThreatTracker.open_four_blocks): any other move loses to the open four.
+A four of the defender must be blocked by the attacker, and a five of the
+defender refutes the line. Threats are read from a ThreatTracker
+(see threat_tracker.py), whose tables cover the shapes of the line patterns.
+
+The search is bounded by the number of attacker moves and by a node budget,
+so it answers in milliseconds. Not finding a win proves nothing: the
+position is then left to the full-width searches.
+"""
+
+from board_util import GoBoardUtil
+from threat_tracker import ThreatTracker
+
+"""
+Default limits: attacker moves of a VCF and of a VCT, and nodes of a search
+"""
+VCF_DEPTH = 12
+VCT_DEPTH = 4
+MAX_NODES = 5000
+
+class ThreatSearch(object):
+
+    def __init__(self, board, threats = None, max_nodes = MAX_NODES):
+        """
+        Search the current position of board, whose moves must also be
+        given to threats, its ThreatTracker, if there is one.
+        The board is left in the same position.
+        """
+        self.board = board
+        if threats is None:
+            threats = ThreatTracker(board)
+        self.threats = threats
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        # table[(hash, threes)] = (depth, line) of searched positions
+        self.table = {}
+
+    def find_win(self, color, vct = True):
+        """
+        Return the line of moves of a forced win of color, to play first,
+        starting with its move, or None if none is found:
+        a VCF, else if vct a VCT of increasing depth.
+        """
+        board = self.board
+        current_player = board.current_player
+        try:
+            line = self._attack(color, VCF_DEPTH, False)
+            depth = 2
+            while line is None and vct and depth <= VCT_DEPTH \
+                and self.nodes < self.max_nodes:
+                line = self._attack(color, depth, True)
+                depth += 1
+        finally:
+            board.current_player = current_player
+        return line
+
+    def _play(self, point, color):
+        self.board.play_move_gomoku(point, color)
+        self.threats.play(point, color)
+
+    def _undo(self, point, color):
+        self.threats.undo(point, color)
+        self.board.undo_move_gomoku()
+
+    def _attack(self, color, depth, threes):
+        """
+        Return a winning line of color to play, with at most depth more
+        threats, only fours unless threes, or None
+        """
+        threats = self.threats
+        if threats.wins[color]:
+            return [min(threats.wins[color])]
+        opponent = GoBoardUtil.opponent(color)
+        if len(threats.wins[opponent]) > 1:
+            return None
+        if self.nodes >= self.max_nodes:
+            return None
+        key = (self.board.hash, threes)
+        entry = self.table.get(key)
+        if entry is not None and (entry[1] is not None or entry[0] >= depth):
+            return entry[1]
+        self.nodes += 1
+        if threats.wins[opponent]:
+            # block the four of the opponent, which need not be a threat
+            moves = list(threats.wins[opponent])
+        elif depth <= 0:
+            return None
+        else:
+            fours = threats.four_moves(color)
+            moves = sorted(fours)
+            if threes:
+                moves += sorted(threats.three_moves(color) - fours)
+        line = None
+        for move in moves:
+            self._play(move, color)
+            line = self._defend(opponent, depth - 1, threes)
+            self._undo(move, color)
+            if line is not None:
+                line = [move] + line
+                break
+        self.table[key] = (depth, line)
+        return line
+
+    def _defend(self, color, depth, threes):
+        """
+        Return a winning line of the opponent of color, color to play,
+        against all its replies to the threats, or None
+        """
+        threats = self.threats
+        if threats.wins[color]:
+            return None
+        attacker = GoBoardUtil.opponent(color)
+        wins = threats.wins[attacker]
+        if len(wins) > 1:
+            block = min(wins)
+            return [block, max(wins)]
+        if wins:
+            moves = list(wins)
+        elif threes and threats.fours[attacker]:
+            moves = sorted(threats.four_moves(color) |
+                           threats.open_four_blocks(attacker))
+        else:
+            return None
+        first = None
+        for move in moves:
+            self._play(move, color)
+            line = self._attack(attacker, depth, threes)
+            self._undo(move, color)
+            if line is None:
+                return None
+            if first is None:
+                first = [move] + line
+        if first is None:
+            # no reply stops the open four
+            return []
+        return first
+
+def find_forced_win(board, color, vct = True, max_nodes = MAX_NODES):
+    """
+    Return the line of a forced win of color on board, see ThreatSearch.find_win
+    """
+    return ThreatSearch(board, max_nodes = max_nodes).find_win(color, vct)
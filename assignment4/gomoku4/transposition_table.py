@@ -0,0 +1,76 @@
+"""
+transposition_table.py
+
+Bounded transposition table for BoardSearcher.
+Entries are indexed by a Zobrist key (see board_util.zobrist_table)
+and store the search depth, bound type, score and best move of a position.
+"""
+
+"""
+Bound type of a stored score
+"""
+EXACT = 0
+LOWER = 1     # score is a lower bound (search failed high)
+UPPER = 2     # score is an upper bound (search failed low)
+
+class TranspositionTable(object):
+    """
+    Fixed size table with one entry per slot, slot = key % size.
+    Replacement policy: an entry is overwritten by an entry for the same
+    position, by a search at least as deep, or by any entry once it was
+    stored in an earlier search (generation).
+    """
+
+    def __init__(self, size = 1 << 16):
+        self.size = size
+        self.slots = [None] * size
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def clear(self):
+        self.slots = [None] * self.size
+        self.generation = 0
+
+    def new_search(self):
+        """
+        Age all current entries, so they can be replaced by the next search.
+        """
+        self.generation += 1
+
+    def probe(self, key):
+        """
+        Return (depth, bound, score, move) stored for key, or None.
+        """
+        entry = self.slots[key % self.size]
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] != key:
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry[1:5]
+
+    def store(self, key, depth, bound, score, move):
+        index = key % self.size
+        entry = self.slots[index]
+        if entry is not None:
+            if entry[0] != key and entry[5] == self.generation \
+                and entry[1] > depth:
+                return
+            self.overwrites += 1
+        self.slots[index] = (key, depth, bound, score, move, self.generation)
+        self.stores += 1
+
+    def stats(self):
+        used = self.size - self.slots.count(None)
+        return "hits {} misses {} collisions {} stores {} overwrites {} used {}/{}" \
+            .format(self.hits, self.misses, self.collisions,
+                    self.stores, self.overwrites, used, self.size)
@@ -5,6 +5,7 @@
 from gtp_connection import GtpConnection
 from board_util import GoBoardUtil, EMPTY
 from simple_board import SimpleGoBoard
+from solver import Solver
 
 import random
 import numpy as np
@@ -45,6 +46,8 @@ class GomokuSimulationPlayer(object):
         self.name="Gomoku3"
         self.version = 3.0
         self.best_move=None
+        # alpha-beta solver of genmove, with the score of the last search
+        self.solver=Solver()
     
     def set_playout_policy(self, playout_policy='random'):
         assert(playout_policy in ['random', 'rule_based'])
@@ -120,7 +123,7 @@ def run():
     start the gtp connection and wait for commands.
     """
     board = SimpleGoBoard(7)
-    con = GtpConnection(GomokuSimulationPlayer(), board)
+    con = GtpConnection(GomokuSimulationPlayer(), board, ponder=True)
     con.start_connection()
 
 if __name__=='__main__':
@@ -5,378 +5,257 @@ from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, \
     MAXSIZE, NULLPOINT
 import gtp_connection
 import score
+from line_patterns import build_table
 
 debug = False
 
-def point_to_coord(point, boardsize):
+def _scan_line(values, pos, color): 
     """
-    Transform point given as board array index
-    to (row, col) coordinate representation.
-    Special case: PASS is not transformed
+    score of the point at pos in one direction, the line is read in the 
+    forward direction of that direction and the point counts as a stone of color
     """
-    if point == PASS:
-        return PASS
-    else:
-        NS = boardsize + 1
-        return divmod(point, NS)
-
-# this table is very important!!! 
-score_cache = None
-score_color = None
-
-def init_score_cache(board: SimpleGoBoard): 
-    global score_cache
-    # score_cache[color][direction][row][col]
-    # this is to store the scores calculated before sometimes we don't compute some directions
-    # and score_cache is to store those scores 
-    score_cache = {\
-        BLACK: (\
-            [[0 for _ in range(board.size + 1)] for _ in range(board.size + 1)],\
-            [[0 for _ in range(board.size + 1)] for _ in range(board.size + 1)],\
-            [[0 for _ in range(board.size + 1)] for _ in range(board.size + 1)],\
-            [[0 for _ in range(board.size + 1)] for _ in range(board.size + 1)]), 
-        
-        WHITE: (\
-            [[0 for _ in range(board.size + 1)] for _ in range(board.size + 1)],\
-            [[0 for _ in range(board.size + 1)] for _ in range(board.size + 1)],\
-            [[0 for _ in range(board.size + 1)] for _ in range(board.size + 1)],\
-            [[0 for _ in range(board.size + 1)] for _ in range(board.size + 1)])\
-        }
-
-    global score_color
-    score_color = {BLACK: [[0 for _ in range(board.size+1)] for _ in range(board.size+1)], WHITE: [[0 for _ in range(board.size+1)] for _ in range(board.size+1)]}
-
-
-
-def _constrained_index_2d(board, row, col): 
-    if row <= 0 or row > board.size or col <= 0 or col > board.size: 
-        return BORDER
-    p = coord_to_point(row, col, board.size)
-    return board.board[p]
-
-def evaluate_point_dir(board: SimpleGoBoard, row, col, color, direction):
-    # if debug: 
-    #     print(123)
-    result = 0
-    empty = 0
-    count = 0
+    length = len(values)
+    count = 1
     block = 0
+    empty = -1
     second_count = 0
 
-    board_size = board.size
-
-    if direction is None or direction == score.WEST_EAST: 
-        count = 1
-        block = 0
-        empty = -1
-        second_count = 0
-
-        i = col
-        while 1: 
-            i += 1
-            if i > board_size: 
-                block += 1
-                break 
-            p = _constrained_index_2d(board, row, i)
-            if p == EMPTY: 
-                if empty == -1 and i < board_size and _constrained_index_2d(board, row, i+1) == color: 
-                    empty = count
-                    continue
-                else: 
-                    break 
-            if p == color: 
-                count += 1
-                continue
-            else: 
-                block += 1
-                break
-
-        i = col
-        while 1: 
-            i -= 1
-            if i <= 0: 
-                block += 1
-                break
-            p = _constrained_index_2d(board, row, i)
-            if p == EMPTY: 
-                if empty == -1 and i > 1 and _constrained_index_2d(board, row, i-1) == color: 
-                    empty = 0
-                    continue
-                else: 
-                    break
-            if p == color: 
-                second_count += 1
-                if empty != -1: 
-                    empty += 1
+    i = pos
+    while 1: 
+        i += 1
+        if i >= length: 
+            block += 1
+            break
+        p = values[i]
+        if p == EMPTY: 
+            if empty == -1 and i < length - 1 and values[i+1] == color: 
+                empty = count
                 continue
             else: 
-                block += 1
                 break
+        if p == color: 
+            count += 1
+            continue
+        else: 
+            block += 1
+            break
 
-
-        count += second_count
-        score_cache[color][score.WEST_EAST][row][col] = score.count_to_score(count, block, empty)
-
-    # this is very important! remember to add the previously evaluated score!!! 
-    result += score_cache[color][score.WEST_EAST][row][col]
-
-    if direction is None or direction == score.NORTH_SOUTH: 
-        count = 1
-        block = 0
-        empty = -1
-        second_count = 0
-
-        i = row
-        while 1: 
-            i += 1
-            if i > board_size: 
-                block += 1
-                break
-            p = _constrained_index_2d(board, i, col)
-            if p == EMPTY: 
-                if empty == -1 and i < board_size and _constrained_index_2d(board, i+1, col) == color: 
-                    empty = count
-                    continue
-                else: 
-                    break
-            if p == color: 
-                count += 1
+    i = pos
+    while 1: 
+        i -= 1
+        if i < 0: 
+            block += 1
+            break
+        p = values[i]
+        if p == EMPTY: 
+            if empty == -1 and i > 0 and values[i-1] == color: 
+                empty = 0
                 continue
             else: 
-                block += 1
                 break
+        if p == color: 
+            second_count += 1
+            if empty != -1: 
+                empty += 1
+            continue
+        else: 
+            block += 1
+            break
 
-        i = row
-        while 1: 
-            i -= 1
-            if i <= 0: 
-                block += 1
-                break
-            p = _constrained_index_2d(board, i, col)
-            if p == EMPTY: 
-                if empty == -1 and i > 1 and _constrained_index_2d(board, i-1, col) == color: 
-                    empty = 0
-                    continue
-                else: 
-                    break
-            if p == color: 
-                second_count += 1
-                if empty != -1: 
-                    empty += 1
-                continue
-            else: 
-                block += 1
-                break 
-
-        count += second_count
-        score_cache[color][score.NORTH_SOUTH][row][col] = score.count_to_score(count, block, empty)
-    result += score_cache[color][score.NORTH_SOUTH][row][col]
-
-    if direction is None or direction == score.NORTHWEST_SOUTHEAST: 
-        # print('NWSE')
-        count = 1
-        block = 0
-        empty = -1
-        second_count = 0
-        i = 0
-        while 1: 
-            i += 1
-            x = row + i
-            y = col + i
-            if x > board_size or y > board_size: 
-                block += 1
-                break
-            p = _constrained_index_2d(board, x, y)
-            if p == EMPTY: 
-                if empty == -1 and (x < board_size and y < board_size) and _constrained_index_2d(board, x+1, y+1) == color: 
-                    empty = count 
+    count += second_count
+    return score.count_to_score(count, block, empty)
+
+
+# the score of a point in one direction only depends on the line through it, 
+# and not on the point itself, so it is looked up by the code of the line 
+# (see line_patterns.py) and the position of the point on the line
+# forward step (row, col) of every direction
+DIRECTION_STEPS = {
+    score.WEST_EAST: (0, 1), 
+    score.NORTH_SOUTH: (1, 0), 
+    score.NORTHWEST_SOUTHEAST: (1, 1), 
+    score.NORTHEAST_SOUTHWEST: (1, -1)}
+
+# lines whose tables are all built up front, a whole 7x7 line
+MAX_TABLE_LENGTH = 7
+
+# a move changes the scores of the points of its 4 lines up to this distance. 
+# _scan_line reads a run of stones and one gap up to the first block, which 
+# can be anywhere on the line, so the whole lines are updated: with a 
+# smaller radius the far points keep stale scores, and the score of a 
+# position depends on the moves played and undone before reaching it
+UPDATE_RADIUS = MAXSIZE
+
+# line_cache[size] = (lines, line_of, segments, near)
+# lines[index] = (points, weights, direction) of every line of the board, 
+# weights[k] = 4 ** k is the weight of points[k] in the code of the line
+# line_of[direction][point] = (index, pos), pos is the index of point in its line
+# segments[direction][point] = (index, points, positions) of the points of 
+# the line through point within UPDATE_RADIUS, and their positions on the line
+# near[point]: the points of the 4 segments of point
+# they only depend on the size and are shared by all evaluators
+line_cache = {}
+# score_tables[(length, pos, color)][code] = score of the point at pos
+# lists for short lines, built once, dicts filled on first use for longer ones
+score_tables = {}
+# array_tables[(length, color)][pos, code] = score_tables[(length, pos, color)][code]
+# for the short lines, so that the points of a line are scored in one lookup
+array_tables = {}
+
+def init_line_tables(size): 
+    if size in line_cache: 
+        return 
+    maxpoint = size * size + 3 * (size + 1)
+    lines = []
+    line_of = {}
+    for direction, (dr, dc) in DIRECTION_STEPS.items(): 
+        line_of[direction] = [None] * maxpoint
+        for row in range(1, size + 1): 
+            for col in range(1, size + 1): 
+                if 1 <= row - dr <= size and 1 <= col - dc <= size: 
+                    # not the first point of its line
                     continue
-                else: 
-                    break
-            if p == color: 
-                count += 1
+                index = len(lines)
+                points = []
+                r, c = row, col
+                while 1 <= r <= size and 1 <= c <= size: 
+                    point = coord_to_point(r, c, size)
+                    line_of[direction][point] = (index, len(points))
+                    points.append(point)
+                    r += dr
+                    c += dc
+                length = len(points)
+                weights = np.array([4 ** k for k in range(length)], dtype = np.int64)
+                lines.append((np.array(points), weights, direction))
+                for color in (BLACK, WHITE): 
+                    for pos in range(length): 
+                        key = (length, pos, color)
+                        if key in score_tables: 
+                            continue
+                        if length <= MAX_TABLE_LENGTH: 
+                            score_tables[key] = build_table(length, 
+                                lambda values, pos=pos, color=color: _scan_line(values, pos, color))
+                        else: 
+                            score_tables[key] = {}
+                    if length <= MAX_TABLE_LENGTH and (length, color) not in array_tables: 
+                        # codes with a BORDER cell are never looked up
+                        array_tables[(length, color)] = np.array(
+                            [[0 if s is None else s for s in score_tables[(length, pos, color)]] 
+                             for pos in range(length)], dtype = np.int64)
+    segments = {}
+    near = [None] * maxpoint
+    for direction in DIRECTION_STEPS: 
+        segments[direction] = [None] * maxpoint
+        for point in range(maxpoint): 
+            if line_of[direction][point] is None: 
                 continue
-            else: 
-                block += 1
-                break
+            index, pos = line_of[direction][point]
+            points = lines[index][0]
+            low = max(0, pos - UPDATE_RADIUS)
+            high = min(len(points), pos + UPDATE_RADIUS + 1)
+            segments[direction][point] = (index, points[low:high], np.arange(low, high))
+    for point in range(maxpoint): 
+        if segments[score.WEST_EAST][point] is not None: 
+            near[point] = np.unique(np.concatenate(
+                [segments[direction][point][1] for direction in DIRECTION_STEPS]))
+    line_cache[size] = (lines, line_of, segments, near)
+
+def line_code(board: SimpleGoBoard, index): 
+    points, weights, _ = line_cache[board.size][0][index]
+    return int(board.board[points].dot(weights))
+
+def _line_score(board: SimpleGoBoard, index, pos, color, code): 
+    points, weights, _ = line_cache[board.size][0][index]
+    length = len(points)
+    table = score_tables[(length, pos, color)]
+    if length <= MAX_TABLE_LENGTH: 
+        return table[code]
+    s = table.get(code)
+    if s is None: 
+        s = table[code] = _scan_line(board.board[points].tolist(), pos, color)
+    return s
 
-        i = 0
-        while 1: 
-            i += 1
-            x = row - i
-            y = col - i
-            if x <= 0 or y <= 0: 
-                block += 1
-                break
-            p = _constrained_index_2d(board, x, y)
-            if p == EMPTY: 
-                if empty == -1 and (x > 1 and y > 1) and _constrained_index_2d(board, x-1, y-1) == color: 
-                    empty = 0 
-                    continue
-                else: 
-                    break
-            if p == color: 
-                second_count += 1
-                if empty != -1: 
-                    empty += 1
-                continue
-            else: 
-                block += 1
-                break
 
-        count += second_count
-        score_cache[color][score.NORTHWEST_SOUTHEAST][row][col] = score.count_to_score(count, block, empty)
-    result += score_cache[color][score.NORTHWEST_SOUTHEAST][row][col]
-
-    if direction is None or direction == score.NORTHEAST_SOUTHWEST: 
-        # print('NESW')
-        count = 1
-        block = 0
-        empty = -1
-        second_count = 0
-
-        i = 0
-        while 1: 
-            i += 1
-            x = row + i
-            y = col - i
-            if x <= 0 or y <= 0 or x > board_size or y > board_size: 
-                block += 1
-                break
-            p = _constrained_index_2d(board, x, y)
-            if p == EMPTY: 
-                if empty == -1 and (x < board_size and y > 1) and _constrained_index_2d(board, x+1, y-1) == color: 
-                    empty = count
-                    continue
-                else: 
-                    break
-            if p == color: 
-                count += 1
-                continue
-            else: 
-                block += 1
-                break
+class Evaluator(object): 
+    """
+    Scores of the points of one board, for the solver. 
+    scores[color, direction, point]: score of point for color in direction, 
+    the point counting as a stone of color
+    totals[color, point]: the sum of the scores of point in the 4 directions, 
+    for both colors if point is empty, for the color of its stone else, 
+    and 0 for the other color
+    The arrays are computed by evaluate, and kept up to date by update, 
+    which must be called after every move played or undone on the board. 
+    Each board has its own evaluator (see evaluate_board), so several boards 
+    can be evaluated at the same time. 
+    """
 
-        i = 0
-        while 1: 
-            i += 1
-            x = row - i
-            y = col + i
-            if x <= 0 or y <= 0 or x > board_size or y > board_size: 
-                block += 1
-                break
-            p = _constrained_index_2d(board, x, y)
-            if p == EMPTY: 
-                if empty == -1 and (x > 1 and y < board_size) and _constrained_index_2d(board, x-1, y+1) == color: 
-                    empty = 0
-                    continue
-                else: 
-                    break
-            if p == color: 
-                second_count += 1
-                if empty != -1: 
-                    empty += 1
-                continue
+    def __init__(self, board: SimpleGoBoard): 
+        self.board = board
+        init_line_tables(board.size)
+        self.lines, self.line_of, self.segments, self.near = line_cache[board.size]
+        self.points = where1d(board.board != BORDER)
+        self.scores = np.zeros((3, len(DIRECTION_STEPS), board.maxpoint), dtype = np.int64)
+        self.totals = np.zeros((3, board.maxpoint), dtype = np.int64)
+        self.evaluate()
+
+    def copy(self, board: SimpleGoBoard): 
+        """
+        Return a copy of this evaluator for board, a copy of self.board
+        """
+        e = Evaluator.__new__(Evaluator)
+        e.__dict__.update(self.__dict__)
+        e.board = board
+        e.scores = np.copy(self.scores)
+        e.totals = np.copy(self.totals)
+        return e
+
+    def _score_line(self, direction, index, points, positions): 
+        """
+        score the points of line index, at positions of the line, for both colors
+        """
+        code = line_code(self.board, index)
+        length = len(self.lines[index][0])
+        for color in (BLACK, WHITE): 
+            table = array_tables.get((length, color))
+            if table is not None: 
+                self.scores[color, direction, points] = table[positions, code]
             else: 
-                block += 1
-                break
-        count += second_count
-        score_cache[color][score.NORTHEAST_SOUTHWEST][row][col] = score.count_to_score(count, block, empty)
-    result += score_cache[color][score.NORTHEAST_SOUTHWEST][row][col]
-
-    # if debug: 
-    #     print(score_cache[color][score.WEST_EAST][row][col],score_cache[color][score.NORTH_SOUTH][row][col],score_cache[color][score.NORTHEAST_SOUTHWEST][row][col],score_cache[color][score.NORTHWEST_SOUTHEAST][row][col])
-
-    return result
-
-
-
+                self.scores[color, direction, points] = [
+                    _line_score(self.board, index, pos, color, code) for pos in positions]
+
+    def _sum_scores(self, points): 
+        cells = self.board.board[points]
+        sums = self.scores[:, :, points].sum(axis = 1)
+        self.totals[BLACK, points] = np.where(cells == WHITE, 0, sums[BLACK])
+        self.totals[WHITE, points] = np.where(cells == BLACK, 0, sums[WHITE])
+
+    def evaluate(self): 
+        for index, (points, _, direction) in enumerate(self.lines): 
+            self._score_line(direction, index, points, np.arange(len(points)))
+        self._sum_scores(self.points)
+
+    def update(self, move): 
+        # only update those points that are affected: 
+        # the points of the 4 lines through move
+        if move == PASS: 
+            return 
+        for direction in DIRECTION_STEPS: 
+            index, points, positions = self.segments[direction][move]
+            self._score_line(direction, index, points, positions)
+        self._sum_scores(self.near[move])
 
 
 def evaluate_board(board: SimpleGoBoard): 
-    init_score_cache(board)
-    # current_player = board.current_player
-    # opponent_player = GoBoardUtil.opponent(current_player)
-    for row in range(1, board.size+1): 
-        for col in range(1, board.size+1): 
-            p = _constrained_index_2d(board, row, col)
-            m = coord_to_point(row, col, board.size)
-            if p == EMPTY: 
-                board.board[m] = WHITE
-                score_color[WHITE][row][col] = evaluate_point_dir(board, row, col, WHITE, None)
-                board.board[m] = BLACK
-                score_color[BLACK][row][col] = evaluate_point_dir(board, row, col, BLACK, None)
-                board.board[m] = EMPTY
-            elif p == WHITE: 
-                score_color[WHITE][row][col] = evaluate_point_dir(board, row, col, WHITE, None)
-                score_color[BLACK][row][col] = 0
-            elif p == BLACK: 
-                score_color[WHITE][row][col] = 0
-                score_color[BLACK][row][col] = evaluate_point_dir(board, row, col, BLACK, None)
-    return 
-
-
-def update_dir(board: SimpleGoBoard, row, col, direction): 
-    current = _constrained_index_2d(board, row, col)
-    m = coord_to_point(row, col, board.size)
-    if current == EMPTY: 
-        board.board[m] = WHITE
-        score_color[WHITE][row][col] = evaluate_point_dir(board, row, col, WHITE, direction)
-        board.board[m] = BLACK
-        score_color[BLACK][row][col] = evaluate_point_dir(board, row, col, BLACK, direction)
-        board.board[m] = EMPTY
-    elif current == BLACK or current == WHITE: 
-        oppponent = GoBoardUtil.opponent(current)
-        score_color[current][row][col] = evaluate_point_dir(board, row, col, current, direction)
-        score_color[oppponent][row][col] = 0
-    return 
-    
+    """
+    evaluate board, and keep its Evaluator in board.evaluator
+    """
+    board.evaluator = Evaluator(board)
+    return board.evaluator
 
 
 def update_board(board: SimpleGoBoard, move): 
-    # only update those points that are affected 
-    boardsize = board.size
-    r = 4
-    if move == PASS: 
-        return 
-    row, col = point_to_coord(move, boardsize)
-    for i in range(-r, r+1): 
-        x = row
-        y = col + i
-        if y <= 0: 
-            continue
-        if y > boardsize: 
-            break 
-        update_dir(board, x, y, score.WEST_EAST)
-
-    for i in range(-r, r+1): 
-        x = row + i
-        y = col
-        if x <= 0: 
-            continue
-        if x > boardsize: 
-            break 
-        update_dir(board, x, y, score.NORTH_SOUTH)
-
-    for i in range(-r, r+1): 
-        x = row + i
-        y = col + i
-        if x <= 0 or y <= 0: 
-            continue
-        if x > boardsize or y > boardsize: 
-            break
-        update_dir(board, x, y, score.NORTHWEST_SOUTHEAST)
-
-    for i in range(-r, r+1): 
-        x = row + i
-        y = col - i
-        if x <= 0 or y <= 0: 
-            continue
-        if x > boardsize or y > boardsize: 
-            continue
-        update_dir(board, x, y, score.NORTHEAST_SOUTHWEST)
-
-    return 
+    board.evaluator.update(move)
 
 
 def gen_possible_moves(board: SimpleGoBoard, color): 
@@ -391,13 +270,12 @@ def gen_possible_moves(board: SimpleGoBoard, color):
     current = color
     opponent = GoBoardUtil.opponent(current)
 
-    empty_points = board.get_empty_points()
-    for point in empty_points: 
-        row, col = point_to_coord(point, board.size)
-        current_score = score_color[current][row][col]
-        opponent_score = score_color[opponent][row][col]
-
-        move = coord_to_point(row, col, board.size)
+    current_scores = board.evaluator.totals[current].tolist()
+    opponent_scores = board.evaluator.totals[opponent].tolist()
+    empty_points = board.get_empty_points().tolist()
+    for move in empty_points: 
+        current_score = current_scores[move]
+        opponent_score = opponent_scores[move]
 
         # always consider current side, then the opposite side 
         if current_score >= score.FIVE: 
@@ -472,53 +350,32 @@ def gen_possible_moves(board: SimpleGoBoard, color):
     return result[:20]
 
 
-def adjust_score(s: int) -> int: 
+# adjust_scores: the scores s with ADJUST_BOUNDS[i - 1] <= s < ADJUST_BOUNDS[i]
+# become s * ADJUST_KEEP[i] + ADJUST_VALUES[i]
+ADJUST_BOUNDS = np.array([score.BLOCKED_FOUR, score.BLOCKED_FOUR + score.THREE, 
+                          score.BLOCKED_FOUR * 2, score.FOUR], dtype = np.int64)
+ADJUST_KEEP = np.array([1, 0, 0, 0, 1], dtype = np.int64)
+ADJUST_VALUES = np.array([0, score.THREE, score.FOUR, score.FOUR * 2, 0], dtype = np.int64)
+
+def adjust_scores(s): 
     """
-    adjust the score between blocked four and open three, 
+    adjust the scores of the array s between blocked four and open three, 
     because they are not that significant if appear alone
     """
     # blocked four < blocked four + three < blocked four * 2 < four
-    if (score.BLOCKED_FOUR <= s and s < score.FOUR): 
-        if (s < score.BLOCKED_FOUR + score.THREE): 
-            # single blocked four
-            return score.THREE
-        elif (s < score.BLOCKED_FOUR * 2): 
-            # blocked four + open three, we win
-            return score.FOUR
-        else: 
-            # double blocked four, we win, but it's more significant 
-            return score.FOUR * 2
-    return s
+    # single blocked four: three, blocked four + open three, we win: four, 
+    # double blocked four, we win, but it's more significant: four * 2
+    i = ADJUST_BOUNDS.searchsorted(s, side = 'right')
+    return s * ADJUST_KEEP[i] + ADJUST_VALUES[i]
 
 
 def point_estimation(board: SimpleGoBoard, color: int) -> int: 
     """
     a point estimation at search limit
     """
-    current_score = 0
-    opponent_score = 0
     opponent_color = GoBoardUtil.opponent(color)
-    for row in range(1, board.size+1): 
-        for col in range(1, board.size+1): 
-            c = _constrained_index_2d(board, row, col)
-            if c == color: 
-                current_score += adjust_score(score_color[color][row][col])
-            elif c == opponent_color: 
-                opponent_score += adjust_score(score_color[opponent_color][row][col])
-    return current_score - opponent_score
-    
-                
-                
-                
-
-
-    
-                
-
-
-        
-
-
-        
-
-            
+    totals = board.evaluator.totals
+    cells = board.board
+    current_score = adjust_scores(totals[color][cells == color]).sum()
+    opponent_score = adjust_scores(totals[opponent_color][cells == opponent_color]).sum()
+    return int(current_score - opponent_score)
@@ -12,16 +12,16 @@ from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, PASS, \
                        MAXSIZE, coord_to_point
 import numpy as np
 import re
-import signal
 import solver
+from time_manager import TimeManager
+from ponder import Ponderer
 import random
 
-board_is_evaluated = False
 total_steps = 0
 
 class GtpConnection():
 
-    def __init__(self, go_engine, board, debug_mode = False):
+    def __init__(self, go_engine, board, debug_mode = False, ponder = False):
         """
         Manage a GTP connection for a Go-playing engine
 
@@ -31,11 +31,14 @@ class GtpConnection():
             a program that can reply to a set of GTP commandsbelow
         board: 
             Represents the current board state.
+        ponder:
+            search on the opponent's time with the ponder of 
+            the solver of go_engine, 
+            see ponder.py
         """
         self._debug_mode = debug_mode
         self.go_engine = go_engine
         self.board = board
-        signal.signal(signal.SIGALRM, self.handler)
         self.commands = {
             "protocol_version": self.protocol_version_cmd,
             "quit": self.quit_cmd,
@@ -61,9 +64,12 @@ class GtpConnection():
             "solve": self.solve_cmd,
             "list_solve_point": self.list_solve_point_cmd, # below is added for Gomoku3
             "policy": self.set_playout_policy, 
-            "policy_moves": self.display_pattern_moves
+            "policy_moves": self.display_pattern_moves,
+            "ponder": self.ponder_cmd
         }
         self.timelimit=60-1
+        self.ponder = ponder
+        self.ponderer = Ponderer()
 
         # used for argument checking
         # values: (required number of arguments, 
@@ -75,7 +81,8 @@ class GtpConnection():
             "genmove": (1, 'Usage: genmove {w,b}'),
             "play": (2, 'Usage: play {b,w} MOVE'),
             "legal_moves": (1, 'Usage: legal_moves {w,b}'),
-            "policy":(1, 'Usage: set playout policy {random, rule_based}')
+            "policy":(1, 'Usage: set playout policy {random, rule_based}'),
+            "ponder": (1, 'Usage: ponder {on,off}')
         }
     
     def set_playout_policy(self, args):
@@ -119,6 +126,7 @@ class GtpConnection():
         while line:
             self.get_cmd(line)
             line = stdin.readline()
+        self.ponderer.stop()
 
     def get_cmd(self, command):
         """
@@ -136,6 +144,8 @@ class GtpConnection():
         if not elements:
             return
         command_name = elements[0]; args = elements[1:]
+        # the commands use the board, the search on it must be done
+        self.ponderer.stop()
         if self.has_arg_error(command_name, len(args)):
             return
         if command_name in self.commands:
@@ -258,7 +268,7 @@ class GtpConnection():
         """
         play a move args[1] for given color args[0] in {'b','w'}
         """
-        global board_is_evaluated, total_steps
+        global total_steps
         try:
             board_color = args[0].lower()
             board_move = args[1]
@@ -285,11 +295,10 @@ class GtpConnection():
                 self.debug_msg("Move: {}\nBoard:\n{}\n".
                                 format(board_move, self.board2d()))
             total_steps += 1
-            if not board_is_evaluated: 
+            if self.board.evaluator is None: 
                 solver.evaluate_board(self.board)
-                board_is_evaluated = True
-                pass
-            solver.update_board(self.board, move)
+            else: 
+                solver.update_board(self.board, move)
             self.respond()
         except Exception as e:
             self.respond('{}'.format(str(e)))
@@ -298,18 +307,32 @@ class GtpConnection():
         self.timelimit = args[0]
         self.respond('')
 
-    def handler(self, signum, fram):
-        self.board = self.sboard
-        raise TimeoutError("Times up!")
-        # raise Exception("unknown")
+    def ponder_cmd(self, args):
+        """ Turn the search on the opponent's time on or off """
+        if args[0] not in ('on', 'off'):
+            self.error(self.argmap['ponder'][1])
+            return
+        self.ponder = (args[0] == 'on')
+        self.respond()
+
+    def start_pondering(self, color):
+        """
+        Search on the opponent's time after the genmove of color,
+        until the next command
+        """
+        if not self.ponder:
+            return
+        game_end, _ = self.board.check_game_end_gomoku()
+        if game_end or len(self.board.get_empty_points()) == 0:
+            return
+        self.ponderer.start(self.go_engine.solver.ponder, self.board, color)
 
     def solve_cmd(self, args):
         try:
-            self.sboard = self.board.copy()
-            signal.alarm(int(self.timelimit)-1)
-            winner,move = self.board.solve()
-            self.board = self.sboard
-            signal.alarm(0)
+            # the solver stops at the time limit, and takes back its moves
+            time_manager = TimeManager(int(self.timelimit), 
+                len(self.board.get_empty_points()), self.board.size)
+            winner,move = self.board.solve(time_manager.token)
             if move != "NoMove":
                 if move == None:
                     self.respond('{} {}'.format(winner, self.board._point_to_coord(move)))
@@ -324,7 +347,7 @@ class GtpConnection():
         """
         Generate a move for the color args[0] in {'b', 'w'}, for the game of gomoku.
         """
-        global board_is_evaluated, total_steps
+        global total_steps
         board_color = args[0].lower()
         color = color_to_int(board_color)
         game_end, winner = self.board.check_game_end_gomoku()
@@ -340,23 +363,16 @@ class GtpConnection():
             self.respond("pass")
             return
         move=None
-        signal.signal(signal.SIGALRM, self.handler)
-        signal.alarm(int(self.timelimit)) 
-        if not board_is_evaluated: 
+        if self.board.evaluator is None: 
             solver.evaluate_board(self.board)
-            board_is_evaluated = True
-        try:
-            self.sboard = self.board.copy()
-            # move = self.go_engine.get_move(self.board, color)
-            score, move = solver.solve_alphabeta(self.board, color, True)
-            # print('score:', score)
-            self.board=self.sboard
-            # signal.alarm(0)
-            signal.signal(signal.SIGALRM, signal.SIG_IGN)
-        except TimeoutError:
-            # move=self.go_engine.best_move
+        # move = self.go_engine.get_move(self.board, color)
+        # the search stops at the hard deadline of time_manager, 
+        # and leaves the board as it was
+        time_manager = TimeManager(int(self.timelimit), len(moves), self.board.size)
+        score, move = self.go_engine.solver.solve_alphabeta(self.board, color, True, time_manager)
+        # print('score:', score)
+        if time_manager.out_of_time(): 
             print('times up!')
-            move = solver.best_move
         if move == PASS: 
             print('no appropriate best move!')
             move = random.choice(moves)
@@ -372,6 +388,7 @@ class GtpConnection():
             solver.update_board(self.board, move)
             total_steps += 1
             self.respond(move_as_string)
+            self.start_pondering(color)
         else:
             self.respond("illegal move: {}".format(move_as_string))
 
@@ -87,6 +87,8 @@ class SimpleGoBoard(object):
         self.liberty_of = np.full(self.maxpoint, NULLPOINT, dtype = np.int32)
         self._initialize_empty_points(self.board)
         self._initialize_neighbors()
+        # scores of the solver, see evaluate.evaluate_board
+        self.evaluator = None
 
     def copy(self):
         b = SimpleGoBoard(self.size)
@@ -96,6 +98,8 @@ class SimpleGoBoard(object):
         b.current_player = self.current_player
         assert b.maxpoint == self.maxpoint
         b.board = np.copy(self.board)
+        if self.evaluator is not None:
+            b.evaluator = self.evaluator.copy(b)
         return b
 
     def row_start(self, row):
@@ -420,8 +424,16 @@ class SimpleGoBoard(object):
 
         return False, None
 
-    def solve(self):
-        result, move, drawMove = alphabeta.solve(self)
+    def solve(self, stop_token=None):
+        """
+        Solve the position for the player to move, see alphabeta.solve.
+        Return (winner, move), ('unknown', 'NoMove') if stop_token,
+        a StopToken, stopped the solver first.
+        """
+        solution = alphabeta.solve(self, stop_token)
+        if solution is None:
+            return 'unknown', 'NoMove'
+        result, move, drawMove = solution
         if move=="First":
             if result==0:
                 return 'draw',drawMove
@@ -6,8 +6,16 @@ from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, \
 import gtp_connection
 from evaluate import gen_possible_moves, evaluate_board, update_board, debug, point_estimation
 import score
+import threading
+import time
 
-best_move = PASS
+# nodes searched between two polls of the stop token of a search
+CHECK_NODES = 64
+
+# half width of the aspiration window around last_score
+ASPIRATION = 3 * score.THREE
+# score of a won position, the bounds of the full window
+WIN_SCORE = 10 * score.FIVE
 
 def print_board(board):
     size = board.size
@@ -74,85 +82,247 @@ def boolean_negamax(board: SimpleGoBoard, last_move: int, current_color: int) ->
     return best_result, best_move
 
 
-def alphabeta_search(
-    board: SimpleGoBoard, 
-    last_move: int, 
-    current_color: int, 
-    depth: int, 
-    alpha: int, beta: int) -> int:
-    # if last_move is None:
-    #     evaluate_board(board)
-    # last_move is not None
-    if check_winning_condition(board, last_move, board.board[last_move]):
-        return -10 * score.FIVE
-
-    if depth <= 0:
-        return point_estimation(board, current_color)
-    opponent_color = GoBoardUtil.opponent(current_color)
-    moves = gen_possible_moves(board, current_color)
-    if len(moves) == 0:
-        return 0
-    depth -= min(10, len(moves))
-
-    if debug:
-        print_moves(moves, board.size)
+def position_key(board: SimpleGoBoard, color: int): 
+    """
+    key of the position of board with color to play, in Solver.pondered
+    """
+    return board.board.tobytes(), color
 
-    for m in moves:
-        move = m[0]
-        board.board[move] = current_color
-        update_board(board, move)
-        result = -alphabeta_search(board, move, opponent_color, depth, -beta, -alpha)
-        board.board[move] = EMPTY
-        update_board(board, move)
-        if result > alpha:
-            alpha = result
-        if result >= beta:
-            return beta
-        
-    return alpha
-
-
-def solve_alphabeta(board: SimpleGoBoard, color: int, board_is_evaluated=False):
-    result, winner = board.check_game_end_gomoku()
-    if result: 
-        if winner == color:
-            return 10*score.FIVE, None
-        else: 
-            return -10*score.FIVE, None
-    # print('ok')
-    alpha, beta = -10*score.FIVE, 10*score.FIVE
-    if not board_is_evaluated:
-        evaluate_board(board)
-    moves = gen_possible_moves(board, color)
-    print(list(map(lambda t: (t[0], gtp_connection.format_point(
-        gtp_connection.point_to_coord(t[0], board.size)), t[1], t[2]), moves)))
-    if len(moves) == 0: 
-        return 0, None
-    if (gtp_connection.total_steps == 0 or gtp_connection.total_steps == 1) and board.board[36] == EMPTY: 
-        return 1, 36
 
-    # best_move = None
-    global best_move
-    best_move = PASS
-    for m in moves:
-        move = m[0]
-
-        # move_coord = gtp_connection.point_to_coord(move, board.size)
-        # move_as_string = gtp_connection.format_point(move_coord)
-        
-        board.board[move] = color
-        update_board(board, move)
-        result = -alphabeta_search(board, move, GoBoardUtil.opponent(color), 40, -beta, -alpha)
-        # print("trying move:", move_as_string, "score:", result)
+class Solver(object): 
+    """
+    Alpha-beta search of the best move of a color, with the state kept 
+    between and during its searches: 
+    best_move: the best move of the current or last search
+    last_score: score of the last solve_alphabeta, the centre of the next 
+    aspiration window
+    nodes: nodes searched by alphabeta_search in the last solve_alphabeta
+    stopped: whether the last solve_alphabeta was stopped
+    stop_token: time_manager.StopToken of the current solve_alphabeta, 
+    polled by alphabeta_search
+    pondered: results of the searches of ponder, 
+    pondered[position_key(board, color)] = (score, move), 
+    written by the ponder thread, so only accessed under lock
+    Each player has its own solver, see Gomoku4.GomokuSimulationPlayer. 
+    """
 
-        board.board[move] = EMPTY
-        update_board(board, move)
-        if result > alpha: 
-            alpha = result
-            best_move = move
-        if result >= beta: 
-            return beta, move
-    return alpha, best_move
+    def __init__(self): 
+        self.best_move = PASS
+        self.last_score = None
+        self.nodes = 0
+        self.stopped = False
+        self.stop_token = None
+        self.pondered = {}
+        self.lock = threading.Lock()
+
+    def alphabeta_search(
+        self, 
+        board: SimpleGoBoard, 
+        last_move: int, 
+        current_color: int, 
+        depth: int, 
+        alpha: int, beta: int) -> int:
+        """
+        principal variation search: the first move is searched with the window 
+        (alpha, beta), the others with the null window (alpha, alpha + 1), 
+        which only tells whether they beat alpha, and again with (alpha, beta) 
+        if they do
+        once stop_token is stopped, every node takes back its move and returns
+        """
+        self.nodes += 1
+        if self.stop_token is not None and self.nodes % CHECK_NODES == 0 and self.stop_token.stopped(): 
+            self.stopped = True
+        if self.stopped: 
+            return alpha
+        # if last_move is None:
+        #     evaluate_board(board)
+        # last_move is not None
+        if check_winning_condition(board, last_move, board.board[last_move]):
+            return -WIN_SCORE
+
+        if depth <= 0:
+            return point_estimation(board, current_color)
+        opponent_color = GoBoardUtil.opponent(current_color)
+        moves = gen_possible_moves(board, current_color)
+        if len(moves) == 0:
+            return 0
+        depth -= min(10, len(moves))
+
+        if debug:
+            print_moves(moves, board.size)
+
+        for i, m in enumerate(moves):
+            move = m[0]
+            board.board[move] = current_color
+            update_board(board, move)
+            if i == 0:
+                result = -self.alphabeta_search(board, move, opponent_color, depth, -beta, -alpha)
+            else:
+                result = -self.alphabeta_search(board, move, opponent_color, depth, -alpha - 1, -alpha)
+                if alpha < result < beta:
+                    result = -self.alphabeta_search(board, move, opponent_color, depth, -beta, -alpha)
+            board.board[move] = EMPTY
+            update_board(board, move)
+            if self.stopped: 
+                return alpha
+            if result > alpha:
+                alpha = result
+            if result >= beta:
+                return beta
+            
+        return alpha
+
+    def _search_root(self, board: SimpleGoBoard, color: int, moves, alpha: int, beta: int, 
+                     time_manager=None):
+        """
+        principal variation search of the moves of color, with the window (alpha, beta)
+        return (score, move), move is None if no move beats alpha
+        the search stops after a move if time_manager.should_stop, see time_manager.py, 
+        and within a move once stop_token is stopped, whose result is then dropped
+        """
+        opponent = GoBoardUtil.opponent(color)
+        root_move = None
+        for i, m in enumerate(moves):
+            move = m[0]
+
+            # move_coord = gtp_connection.point_to_coord(move, board.size)
+            # move_as_string = gtp_connection.format_point(move_coord)
+            
+            board.board[move] = color
+            update_board(board, move)
+            if i == 0:
+                result = -self.alphabeta_search(board, move, opponent, 40, -beta, -alpha)
+            else:
+                result = -self.alphabeta_search(board, move, opponent, 40, -alpha - 1, -alpha)
+                if alpha < result < beta:
+                    result = -self.alphabeta_search(board, move, opponent, 40, -beta, -alpha)
+            # print("trying move:", move_as_string, "score:", result)
+
+            board.board[move] = EMPTY
+            update_board(board, move)
+            if self.stopped: 
+                break
+            if result > alpha: 
+                alpha = result
+                self.best_move = move
+                root_move = move
+            if result >= beta: 
+                return beta, move
+            if time_manager is not None:
+                time_manager.update(self.best_move)
+                if time_manager.should_stop():
+                    self.stopped = True
+                    break
+        return alpha, root_move
+
+    def solve_alphabeta(self, board: SimpleGoBoard, color: int, board_is_evaluated=False, 
+                        time_manager=None, token=None, verbose=True):
+        """
+        search the moves of color with an aspiration window of ASPIRATION 
+        around the score of the previous search, and if the score falls 
+        outside of it, again with the window from that side to the win score
+        time_manager: a time_manager.TimeManager polled between the root moves, 
+        the best move so far is returned if it stops the search
+        token: a time_manager.StopToken polled every CHECK_NODES nodes, 
+        by default the token of time_manager. the search takes back its moves 
+        and returns the best move so far once it is stopped, 
+        so the board is left as it was
+        a position solved by ponder is not searched again
+        verbose: print the moves of color and their scores
+        """
+        result, winner = board.check_game_end_gomoku()
+        if result: 
+            if winner == color:
+                return WIN_SCORE, None
+            else: 
+                return -WIN_SCORE, None
+        with self.lock: 
+            entry = self.pondered.pop(position_key(board, color), None)
+        if entry is not None: 
+            self.nodes = 0
+            self.stopped = False
+            self.last_score, self.best_move = entry
+            return entry
+        # print('ok')
+        if not board_is_evaluated:
+            evaluate_board(board)
+        moves = gen_possible_moves(board, color)
+        if verbose: 
+            print(list(map(lambda t: (t[0], gtp_connection.format_point(
+                gtp_connection.point_to_coord(t[0], board.size)), t[1], t[2]), moves)))
+        if len(moves) == 0: 
+            return 0, None
+        if (gtp_connection.total_steps == 0 or gtp_connection.total_steps == 1) and board.board[36] == EMPTY: 
+            return 1, 36
+
+        # best_move = None
+        self.best_move = PASS
+        self.nodes = 0
+        self.stopped = False
+        if token is None and time_manager is not None: 
+            token = time_manager.token
+        self.stop_token = token
+        if self.last_score is not None and -WIN_SCORE < self.last_score < WIN_SCORE:
+            alpha, beta = self.last_score - ASPIRATION, self.last_score + ASPIRATION
+            value, move = self._search_root(board, color, moves, alpha, beta, time_manager)
+            if self.stopped:
+                return value, self._stopped_move(moves)
+            if alpha < value < beta:
+                self.last_score = value
+                return value, move
+            # search again the side of the window the score fell on
+            if value <= alpha:
+                value, _ = self._search_root(board, color, moves, -WIN_SCORE, alpha + 1, time_manager)
+            else:
+                value, _ = self._search_root(board, color, moves, beta - 1, WIN_SCORE, time_manager)
+        else:
+            value, _ = self._search_root(board, color, moves, -WIN_SCORE, WIN_SCORE, time_manager)
+        if self.stopped:
+            return value, self._stopped_move(moves)
+        self.last_score = value
+        return value, self.best_move
+
+    def ponder(self, board: SimpleGoBoard, color: int, token) -> None: 
+        """
+        search on the opponent's time, after the move of color on board, 
+        until token, a time_manager.StopToken, is stopped (see ponder.py): 
+        solve_alphabeta the position after each reply of the opponent, 
+        best reply first, and keep the results of the searches that 
+        were not stopped in pondered, for the next solve_alphabeta
+        the searches run on a solver of their own and a copy of board, 
+        so this solver only shares pondered with the thread
+        """
+        with self.lock: 
+            self.pondered.clear()
+        board = board.copy()
+        if board.evaluator is None: 
+            evaluate_board(board)
+        opponent = GoBoardUtil.opponent(color)
+        # the aspiration window of the next search is centred on the score of this one
+        score = self.last_score
+        searcher = Solver()
+        for m in gen_possible_moves(board, opponent): 
+            if token.stopped(): 
+                break
+            reply = m[0]
+            board.board[reply] = opponent
+            update_board(board, reply)
+            if not check_winning_condition(board, reply, opponent): 
+                searcher.last_score = score
+                result = searcher.solve_alphabeta(board, color, True, token = token, verbose = False)
+                if not searcher.stopped: 
+                    with self.lock: 
+                        self.pondered[position_key(board, color)] = result
+            board.board[reply] = EMPTY
+            update_board(board, reply)
+
+    def _stopped_move(self, moves): 
+        """
+        the best move of a stopped search, the first of moves if no move was searched
+        """
+        if self.best_move == PASS: 
+            return moves[0][0]
+        return self.best_move
 
 
 
@@ -213,3 +383,39 @@ def _constrained_index(_board: SimpleGoBoard, point: int) -> int:
     if point lies on the board, return the corresponding color, otherwise return BORDER
     """
     return BORDER if (point < 0 or point >= _board.maxpoint) else _board.board[point]
+
+
+# positions of the node count benchmark, as the moves of a game
+BENCHMARK_GAMES = [
+    ["d4", "c3", "e5", "c5", "d5", "d6", "c4", "e6"], 
+    ["d4", "e4", "c5", "e3", "e5", "e2", "e1", "b6"], 
+    ["c3", "d4", "e5", "b2", "c4", "d3", "b3", "a3"], 
+    ["d4", "d5", "c4", "e4", "c5", "c6", "b6", "f3"]]
+
+def benchmark(games = BENCHMARK_GAMES): 
+    """
+    replay each game on a 7x7 board, and solve_alphabeta the position 
+    after its 5th and 7th moves, so the second search has an aspiration window
+    return (nodes, seconds, scores) of all the searches
+    """
+    total_nodes = 0
+    start = time.time()
+    scores = []
+    for game in games: 
+        board = SimpleGoBoard(7)
+        solver = Solver()
+        for i, move in enumerate(game): 
+            coord = gtp_connection.move_to_coord(move, board.size)
+            board.play_move_gomoku(coord_to_point(coord[0], coord[1], board.size), 
+                                   board.current_player)
+            if i >= 4 and i % 2 == 0: 
+                gtp_connection.total_steps = i + 1
+                value, _ = solver.solve_alphabeta(board, board.current_player)
+                total_nodes += solver.nodes
+                scores.append(value)
+    return total_nodes, time.time() - start, scores
+
+
+if __name__ == '__main__': 
+    total_nodes, seconds, scores = benchmark()
+    print('nodes: {} time: {:.1f}s scores: {}'.format(total_nodes, seconds, scores))
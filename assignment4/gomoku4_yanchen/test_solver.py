@@ -0,0 +1,74 @@
+"""
+test_solver.py
+
+Correctness checks of the search timed by solver.benchmark: the principal
+variation search with an aspiration window finds the score of the search
+with the full window, and ponder keeps the results of that search without
+changing the state of the solver it pondered for. Run with pytest from this
+directory.
+"""
+
+import time
+import numpy as np
+import solver
+import gtp_connection
+from time_manager import StopToken
+from simple_board import SimpleGoBoard
+from board_util import coord_to_point
+
+def benchmark_positions():
+    """
+    the positions of solver.benchmark, with their numbers of moves
+    """
+    for game in solver.BENCHMARK_GAMES:
+        board = SimpleGoBoard(7)
+        for i, move in enumerate(game):
+            coord = gtp_connection.move_to_coord(move, board.size)
+            board.play_move_gomoku(coord_to_point(coord[0], coord[1], board.size),
+                                   board.current_player)
+            if i >= 4 and i % 2 == 0:
+                yield board.copy(), i + 1
+
+def solve(board, steps, last_score):
+    gtp_connection.total_steps = steps
+    searcher = solver.Solver()
+    searcher.last_score = last_score
+    return searcher.solve_alphabeta(board, board.current_player, verbose=False)[0]
+
+def test_aspiration_matches_full_window():
+    for board, steps in benchmark_positions():
+        full = solve(board, steps, None)
+        if abs(full) >= solver.WIN_SCORE:
+            continue
+        # inside the window, and failing low and high
+        for centre in (full, full + 2 * solver.ASPIRATION, full - 2 * solver.ASPIRATION):
+            assert solve(board, steps, centre) == full
+
+def test_search_leaves_board_unchanged():
+    for board, steps in benchmark_positions():
+        stones = board.board.copy()
+        solve(board, steps, None)
+        scores = board.evaluator.scores.copy()
+        solver.evaluate_board(board)
+        assert (board.board == stones).all()
+        assert (board.evaluator.scores == scores).all()
+
+def test_ponder_keeps_solver_state():
+    board, steps = next(benchmark_positions())
+    gtp_connection.total_steps = steps
+    searcher = solver.Solver()
+    searcher.solve_alphabeta(board, board.current_player, verbose=False)
+    color = board.current_player
+    board.play_move_gomoku(searcher.best_move, color)
+    solver.update_board(board, searcher.best_move)
+    state = searcher.best_move, searcher.last_score, searcher.nodes
+    searcher.ponder(board, color, StopToken(time.time() + 5))
+    assert (searcher.best_move, searcher.last_score, searcher.nodes) == state
+    assert len(searcher.pondered) > 0
+    for (key, _), result in searcher.pondered.items():
+        position = board.copy()
+        stones = np.frombuffer(key, dtype=board.board.dtype)
+        reply = [p for p in range(position.maxpoint)
+                 if position.board[p] != stones[p]][0]
+        position.play_move_gomoku(reply, position.current_player)
+        assert solve(position, steps + 2, searcher.last_score) == result[0]
@@ -0,0 +1,111 @@
+"""
+time_manager.py
+
+Time allocation of one genmove.
+
+The timelimit command gives the time of every move. A TimeManager splits it
+into two deadlines, measured from the start of the move:
+- the hard deadline, MARGIN seconds before the limit, so that the answer
+  is sent in time. The search stops at it in any case.
+- the soft deadline, a share of the time up to the hard deadline that
+  depends on the phase of the game: OPENING_SHARE on an empty board,
+  growing to MIDDLE_SHARE once MIDDLE_FILL of the points are taken,
+  where the threats decide the game.
+The engine reports its best move at its check points (the end of an
+iteration, every few playouts), and asks should_stop. After the soft
+deadline it stops, unless the best move keeps changing: the soft deadline
+is scaled by (1 + changes) / 2, changes being the number of times the best
+move changed. So a move whose best move never changes returns after half
+of the soft deadline, and an unstable one gets more time, up to the hard
+deadline.
+
+The hard deadline is kept by a StopToken, which the searches poll at their
+node boundaries: once it is stopped, a search undoes the moves it played
+and returns its best result so far, so the board is left as it was.
+"""
+
+import threading
+import time
+
+class StopToken(object):
+    """
+    Cooperative cancellation of a search: stopped becomes true when stop
+    is called, from any thread, or once the deadline, if any, is passed
+    """
+
+    def __init__(self, deadline = None):
+        self.deadline = deadline
+        self._event = threading.Event()
+
+    def stop(self):
+        self._event.set()
+
+    def stopped(self):
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.time() >= self.deadline:
+            self._event.set()
+            return True
+        return False
+
+"""
+Seconds kept to send the answer before the time limit
+"""
+MARGIN = 0.5
+"""
+Share of the time up to the hard deadline of the soft deadline,
+on an empty board, and from MIDDLE_FILL of the points taken on
+"""
+OPENING_SHARE = 0.3
+MIDDLE_SHARE = 0.6
+MIDDLE_FILL = 0.3
+
+class TimeManager(object):
+
+    def __init__(self, timelimit, empty_points, size):
+        """
+        Start the clock of a move with timelimit seconds,
+        on a board of size with empty_points empty points
+        """
+        self.start = time.time()
+        self.hard = self.start + max(timelimit - MARGIN, timelimit / 2.0)
+        fill = 1.0 - float(empty_points) / (size * size)
+        share = OPENING_SHARE + (MIDDLE_SHARE - OPENING_SHARE) * min(1.0, fill / MIDDLE_FILL)
+        self.soft = self.start + share * (self.hard - self.start)
+        self.best_move = None
+        self.changes = 0
+        # stopped at the hard deadline, or by its stop
+        self.token = StopToken(self.hard)
+
+    def update(self, best_move):
+        """
+        Report the best move of the search so far
+        """
+        if self.best_move is not None and best_move != self.best_move:
+            self.changes += 1
+        self.best_move = best_move
+
+    def soft_deadline(self):
+        """
+        The soft deadline, scaled by the stability of the best move
+        """
+        scale = (1 + self.changes) / 2.0
+        return min(self.hard, self.start + scale * (self.soft - self.start))
+
+    def out_of_time(self):
+        """
+        True once the hard deadline is passed, or the token is stopped
+        """
+        return self.token.stopped()
+
+    def should_stop(self):
+        """
+        True once the soft deadline is passed, or the token is stopped
+        """
+        return self.token.stopped() or time.time() >= self.soft_deadline()
+
+    def remaining(self):
+        """
+        Seconds left until the hard deadline
+        """
+        return max(0.0, self.hard - time.time())
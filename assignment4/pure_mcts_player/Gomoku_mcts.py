@@ -7,14 +7,16 @@ from gtp_connection import GtpConnection
 from board_util import GoBoardUtil, EMPTY
 from simple_board import SimpleGoBoard
 from mcts_pure import MCTS, rollout_policy_fn, policy_value_fn
+from threat_tracker import ThreatTracker
+from opening_book import open_book
+from time_manager import TimeManager
 from timeit import default_timer as timer
 
 import random
 import numpy as np
 
 def undo(board,move):
-    board.board[move]=EMPTY
-    board.current_player=GoBoardUtil.opponent(board.current_player)
+    board.undo_move_gomoku()
 
 def play_move(board, move, color):
     board.play_move_gomoku(move, color)
@@ -37,11 +39,26 @@ class GomokuMCTSPlayer():
     then select the one with best win-rate.
     playout could be either random or rule_based (i.e., uses pre-defined patterns) 
     """
-    def __init__(self, c_puct=5, n_playout=2000):
+    # name of each movetype of rollout_policy, for policy_moves
+    pattern_list = ['Win', 'BlockWin', 'OpenFour', 'BlockOpenFour', 'Random']
+
+    def __init__(self, c_puct=5, n_playout=2000, playout_policy='random'):
         self.name = "Gomoku3"
         self.version = 3.0
         self.best_move = None
-        self.mcts = MCTS(policy_value_fn, c_puct, n_playout)
+        self.playout_policy = playout_policy
+        # seconds per genmove, set by the timelimit command
+        self.timelimit = 60
+        # moves of the position at the root of the tree, or None:
+        # the tree is kept after a genmove for ponder and the next get_move
+        self.tree_history = None
+        self.mcts = MCTS(policy_value_fn, c_puct, n_playout,
+                         rollout_policy=self._rollout_policy(), book=open_book())
+
+    def _rollout_policy(self):
+        if self.playout_policy == 'rule_based':
+            return 'pattern'
+        return 'random'
 
     def get_move(self, board, color_to_play):
         """
@@ -51,16 +68,65 @@ class GomokuMCTSPlayer():
         sensible_moves = GoBoardUtil.generate_legal_moves_gomoku(board)
         if len(sensible_moves) > 0:
             start = timer()
-            move = self.mcts.get_move(board)
+            self._follow_tree(board)
+            time_manager = TimeManager(self.timelimit, len(sensible_moves), board.size)
+            move = self.mcts.get_move(board, time_manager,
+                                      color_to_play=color_to_play)
             end = timer()
-            self.mcts.update_with_move(-1)
+            self.tree_history = self._history(board)
             print("time = ", end-start)
             return move
         else:
             print("WARNING: the board is full")
 
-    def get_best_move_so_far(self):
-        return self.mcts.get_best_move_so_far()
+    def ponder(self, board, color, stop_token):
+        """
+        Grow the tree on the opponent's time, after the genmove of color
+        played on board, until stop_token is stopped (see ponder.py):
+        the subtree of the move of the genmove is searched, and the next
+        get_move keeps the subtree of the move of the opponent.
+        """
+        self._follow_tree(board)
+        self.tree_history = self._history(board)
+        self.mcts.ponder(board.copy(), stop_token)
+
+    def _history(self, board):
+        return tuple(int(m[0]) for m in board.moves)
+
+    def _follow_tree(self, board):
+        """
+        Make the root of the tree the position of board: keep the tree,
+        or the subtree of the last move of board if the root is the
+        position before it, else start a new tree
+        """
+        history = self._history(board)
+        kept = self.tree_history
+        if kept is not None and history[:-1] == kept and len(history) > 0:
+            self.mcts.update_with_move(history[-1])
+        elif kept != history:
+            self.mcts.update_with_move(-1)
+        self.tree_history = None
+
+    def set_workers(self, n_workers):
+        self.mcts.set_workers(n_workers)
+
+    def set_parallel(self, parallel):
+        self.mcts.set_parallel(parallel)
+
+    def set_playout_policy(self, playout_policy):
+        self.playout_policy = playout_policy
+        self.mcts.set_rollout_policy(self._rollout_policy())
+
+    def policy_moves(self, board, color_to_play):
+        """
+        Return (movetype, moves) of the moves that the playout policy
+        chooses from for color_to_play
+        """
+        if self.playout_policy == 'rule_based':
+            movetype, moves = ThreatTracker(board).threat_moves(color_to_play)
+            if moves:
+                return self.pattern_list[movetype], moves
+        return self.pattern_list[-1], list(board.get_empty_points())
         
 
 def run():
@@ -68,7 +134,8 @@ def run():
     start the gtp connection and wait for commands.
     """
     board = SimpleGoBoard(7)
-    con = GtpConnection(GomokuMCTSPlayer(n_playout=4000), board)
+    con = GtpConnection(GomokuMCTSPlayer(n_playout=4000), board, use_bitboard=True,
+                        ponder=True)
     con.start_connection()
 
 if __name__=='__main__':
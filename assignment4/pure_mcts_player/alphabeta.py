@@ -2,8 +2,7 @@ from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER
 #from profilehooks import profile
 
 def undo(board,move):
-    board.board[move]=EMPTY
-    board.current_player=GoBoardUtil.opponent(board.current_player)
+    board.undo_move_gomoku()
 
 def game_end(board):
     game_end, winner = board.check_game_end_gomoku()
@@ -15,8 +14,17 @@ def game_end(board):
         return 0
     return None
 
-def alphabeta(board,alpha,beta):
+def stopped(stop_token):
+    return stop_token is not None and stop_token.stopped()
+
+"""
+stop_token: a time_manager.StopToken, or None. Once it is stopped, every
+node undoes its move and returns, and the result is not used
+"""
+def alphabeta(board,alpha,beta,stop_token=None):
     #print(GoBoardUtil.get_twoD_board(board),alpha,beta)
+    if stopped(stop_token):
+        return alpha
     result=game_end(board)
     if (result!=None):
         return result
@@ -24,7 +32,7 @@ def alphabeta(board,alpha,beta):
     if solvePoint:
         #print(solvePoint[0])
         board.play_move_gomoku(solvePoint[0],board.current_player)
-        result=-alphabeta(board,-beta,-alpha)
+        result=-alphabeta(board,-beta,-alpha,stop_token)
         if(result>alpha):
             alpha=result
         undo(board,solvePoint[0])
@@ -33,47 +41,48 @@ def alphabeta(board,alpha,beta):
     else:
         for m in GoBoardUtil.generate_legal_moves_gomoku(board):
             board.play_move_gomoku(m,board.current_player)
-            result=-alphabeta(board,-beta,-alpha)
+            result=-alphabeta(board,-beta,-alpha,stop_token)
             if(result>alpha):
                 alpha=result
             undo(board,m)
+            if stopped(stop_token):
+                return alpha
             if(result>=beta):
                 return beta
     return alpha
 
 #@profile
 """
-if have winning move, return _,winning_move
-else return have_draw,"NoMove"
+as used by SimpleGoBoard.solve:
+if the game is over, return result,"First",drawMove
+if have winning move, return True,winning_move,None
+else return have_draw,"NoMove",drawMove
+or None if stop_token is stopped before
 """
-def solve(board):
+def solve(board,stop_token=None):
     result=game_end(board)
     if (result!=None):
-        return result,"First"
+        return result,"First","NoMove"
     alpha,beta=-1,1
-    haveDraw=False
+    drawMove=None
     solvePoint=board.list_solve_point()
     if solvePoint:
-        #print(solvePoint[0])
-        board.play_move_gomoku(solvePoint[0],board.current_player)
-        result=-alphabeta(board,-beta,-alpha)
-        undo(board,solvePoint[0])
+        moves=solvePoint[:1]
+    else:
+        moves=GoBoardUtil.generate_legal_moves_gomoku(board)
+    for m in moves:
+        board.play_move_gomoku(m,board.current_player)
+        result=-alphabeta(board,-beta,-alpha,stop_token)
+        #print(GoBoardUtil.get_twoD_board(board))
+        #print(result)
+        undo(board,m)
+        if stopped(stop_token):
+            return None
         if(result==1):
-            return True,solvePoint[0]
-        elif(result==0):
-            haveDraw=True
-    else: 
-        for m in GoBoardUtil.generate_legal_moves_gomoku(board):
-            board.play_move_gomoku(m,board.current_player)
-            result=-alphabeta(board,-beta,-alpha)
-            #print(GoBoardUtil.get_twoD_board(board))
-            #print(result)
-            undo(board,m)
-            if(result==1):
-                return True,m
-            elif(result==0):
-                haveDraw=True
-    return haveDraw,"NoMove"
+            return True,m,None
+        elif(result==0 and drawMove is None):
+            drawMove=m
+    return drawMove is not None,"NoMove",drawMove
 
 
     """
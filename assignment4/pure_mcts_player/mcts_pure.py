@@ -1,6 +1,13 @@
 import copy
+import os
+import random
+import multiprocessing
+from functools import partial
 import numpy as np
 from operator import itemgetter
+from timeit import default_timer as timer
+from node_pool import NodePool
+from threat_tracker import ThreatTracker
 from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, \
                        PASS, is_black_white, coord_to_point, where1d, \
                        MAXSIZE, NULLPOINT, TIE
@@ -12,82 +19,90 @@ def rollout_policy_fn(board):
 
 
 def policy_value_fn(board):
-    moves = GoBoardUtil.generate_legal_moves_gomoku(board)
+    # expand the empty points near a stone only (see
+    # SimpleGoBoard.get_candidate_moves), the rollouts still play anywhere
+    moves = GoBoardUtil.generate_candidate_moves_gomoku(board)
     move_probs = np.ones(len(moves)) / len(moves)
     return zip(moves, move_probs), 0
 
-class TreeNode():
-    """A node in the MCTS tree. Each node keeps track of its own value Q,
-    prior probability P, and its visit-count-adjusted prior score u.
+def evaluate_rollout(board, limit=1000, policy='random', threats=None):
+    """Use the rollout policy to play until the end of the game,
+    returning +1 if the current player wins, -1 if the opponent wins,
+    and 0 if it is a tie.
+    policy: 'random' for rollout_policy_fn, or 'pattern' for
+        ThreatTracker.rollout_move, with threats the tracker of board
+        (a new one is made if it is None)
     """
+    current_player = board.current_player
+    if policy == 'pattern' and threats is None:
+        threats = ThreatTracker(board)
+    for i in range(limit):
+        end, winner = board.check_game_end_gomoku()
+        if end:
+            break
+        color = board.current_player
+        if policy == 'pattern':
+            move = threats.rollout_move(color)
+            threats.play(move, color)
+        else:
+            # use random move in this case
+            move_probs = rollout_policy_fn(board)
+            move = max(move_probs, key=itemgetter(1))[0]
+        board.play_move_gomoku(move, color)
+    else:
+        # If no break from the loop, issue a warning.
+        print("WARNING: rollout reached move limit")
+    if winner == TIE:  # tie
+        return 0
+    else:
+        return 1 if winner == current_player else -1
 
-    def __init__(self, parent, prior_p):
-        self._parent = parent
-        self._children = {}  # a map from action to TreeNode
-        self._n_visits = 0
-        self._Q = 0
-        self._u = 0
-        self._P = prior_p
-
-    def expand(self, move_priors):
-        """Expand tree by creating new children.
-        move_priors: a list of tuples of moves and their prior probability
-            according to the policy function.
-        """
-        for move, prob in move_priors:
-            if move not in self._children:
-                self._children[move] = TreeNode(self, prob)
-
-    def select(self, c_puct):
-        """Select move among children that gives maximum move value Q
-        plus bonus u(P).
-        Return: A tuple of (move, next_node)
-        """
-        return max(self._children.items(),
-                   key=lambda act_node: act_node[1].get_value(c_puct))
-
-    def update(self, leaf_value):
-        """Update node values from leaf evaluation.
-        leaf_value: the value of subtree evaluation from the current player's
-            perspective.
-        """
-        # Count visit.
-        self._n_visits += 1
-        # Update Q, a running average of values for all visits.
-        self._Q += 1.0*(leaf_value - self._Q) / self._n_visits
-
-    def update_recursive(self, leaf_value):
-        """Like a call to update(), but applied recursively for all ancestors.
-        """
-        # If it is not root, this node's parent should be updated first.
-        if self._parent:
-            self._parent.update_recursive(-leaf_value)
-        self.update(leaf_value)
-
-    def get_value(self, c_puct):
-        """Calculate and return the value for this node.
-        It is a combination of leaf evaluations Q, and this node's prior
-        adjusted for its visit count, u.
-        c_puct: a number in (0, inf) controlling the relative impact of
-            value Q, and prior probability P, on this node's score.
-        """
-        self._u = (c_puct * self._P *
-                   np.sqrt(self._parent._n_visits) / (1 + self._n_visits))
-        return self._Q + self._u
+def unwind(board, n_moves, threats=None):
+    """Undo the moves played on board since it had n_moves moves,
+    and on its ThreatTracker threats if there is one.
+    """
+    while len(board.moves) > n_moves:
+        if threats is not None:
+            point, color = board.moves[-1][:2]
+            threats.undo(point, color)
+        board.undo_move_gomoku()
 
-    def is_leaf(self):
-        """Check if leaf node (i.e. no nodes below this have been expanded).
-        """
-        return self._children == {}
+def _seed_worker():
+    """Seed the random generators of a new pool process,
+    which otherwise inherits the state of its parent.
+    """
+    random.seed()
+    np.random.seed()
 
-    def is_root(self):
-        return self._parent is None
+# The tree of a root-parallel worker process: (search id, MCTS)
+_worker_tree = (None, None)
 
+def _root_parallel_playouts(task):
+    """Run playouts in a worker process of MCTS.get_move.
+    Each process grows its own tree for the whole search, over many tasks.
+    task: (search id, board, playouts, seed, c_puct, rollout policy)
+    Return: (pid, {move: visits of the root child} of the tree of this process)
+    """
+    global _worker_tree
+    search_id, board, n_playout, seed, c_puct, rollout_policy = task
+    random.seed(seed)
+    np.random.seed(seed)
+    if _worker_tree[0] != search_id:
+        _worker_tree = (search_id, MCTS(policy_value_fn, c_puct, n_playout,
+                                        rollout_policy=rollout_policy))
+    mcts = _worker_tree[1]
+    mcts._start(board)
+    for n in range(n_playout):
+        mcts._playout(board)
+    return os.getpid(), mcts._tree.child_visits(mcts._tree.root)
 
 class MCTS(object):
-    """A simple implementation of Monte Carlo Tree Search."""
+    """A simple implementation of Monte Carlo Tree Search.
+    The nodes of the tree are indices into a NodePool.
+    """
 
-    def __init__(self, policy_value_fn, c_puct=5, n_playout=10000):
+    def __init__(self, policy_value_fn, c_puct=5, n_playout=10000, n_workers=1,
+                 parallel='root', rollout_policy='random', book=None):
         """
         policy_value_fn: a function that takes in a board state and outputs
             a list of (action, probability) tuples and also a score in [-1, 1]
@@ -96,36 +111,91 @@ class MCTS(object):
         c_puct: a number in (0, inf) that controls how quickly exploration
             converges to the maximum-value policy. A higher value means
             relying on the prior more.
+        n_workers: number of worker processes. With more than one,
+            get_move is root-parallel: every worker grows an independent tree
+            (with the policy_value_fn of this module), and the visit counts
+            of their root children are added up.
+        parallel: 'root' for the root-parallel search above, or 'tree':
+            all workers share one tree, and n_workers * leaves_per_worker
+            leaves are selected at a time with virtual losses, then their
+            rollouts are run together in the pool.
+        rollout_policy: 'random', or 'pattern' for the threat-guided
+            rollouts of threat_tracker.ThreatTracker.
+        book: an opening_book.OpeningBook whose moves are played
+            without search, or None.
         """
-        self._root = TreeNode(None, 1.0)
+        self._tree = NodePool()
         self._policy = policy_value_fn
         self._c_puct = c_puct
         self._n_playout = n_playout
+        self._n_workers = n_workers
+        self._parallel = parallel
+        self._rollout_policy = rollout_policy
+        self._book = book
+        # ThreatTracker of the board of the search, for pattern rollouts
+        self._threats = None
+        self._pool = None
+        self._search_id = 0
+        # merged root child visits of the last root-parallel search
+        self._root_visits = {}
+        # root child visits of the tree of each worker process (by pid)
+        # of the last root-parallel search
+        self._tree_visits = {}
+
+    # playouts of one task of a root-parallel worker, between two merges
+    playouts_per_task = 100
+    # leaves per worker in a batch of the tree-parallel search
+    leaves_per_worker = 4
+    # playouts between two checks of the TimeManager of a sequential search
+    playouts_per_check = 50
+    # seconds between two checks of the stop token while waiting for a task
+    # of a root-parallel worker
+    poll_seconds = 0.05
+    # memory of the tree at which ponder stops, in bytes
+    max_ponder_bytes = 80000000
+
+    def _start(self, board):
+        """Prepare a search on board.
+        """
+        if self._rollout_policy == 'pattern':
+            self._threats = ThreatTracker(board)
+        else:
+            self._threats = None
+
+    def _play(self, board, move):
+        """Play move for the player to move, on board and its ThreatTracker.
+        """
+        if self._threats is not None:
+            self._threats.play(move, board.current_player)
+        board.play_move_gomoku(move, board.current_player)
 
     def _playout(self, board):
         """Run a single playout from the root to the leaf, getting a value at
         the leaf and propagating it back through its parents.
-        State is modified in-place, so a copy must be provided.
+        The moves are played on board, and undone at the end of the playout.
         """
-        node = self._root
+        n_moves = len(board.moves)
+        tree = self._tree
+        node = tree.root
         while(1):
-            if node.is_leaf():
+            if tree.is_leaf(node):
                 break
             # Greedily select next move.
-            move, node = node.select(self._c_puct)
+            move, node = tree.select(node, self._c_puct)
             # state.do_move(action)
-            board.play_move_gomoku(move, board.current_player)
+            self._play(board, move)
 
         move_probs, _ = self._policy(board)
         # Check for end of game
         end, winner = board.check_game_end_gomoku()
         if not end:
-            node.expand(move_probs)
+            tree.expand(node, move_probs)
         
         # Evaluate the leaf node by random rollout
         leaf_value = self._evaluate_rollout(board)
         # Update value and visit count of nodes in this traversal.
-        node.update_recursive(-leaf_value)
+        tree.update_recursive(node, -leaf_value)
+        unwind(board, n_moves, self._threats)
         # print("-----")
 
     def _evaluate_rollout(self, board, limit=1000):
@@ -133,58 +203,249 @@ class MCTS(object):
         returning +1 if the current player wins, -1 if the opponent wins,
         and 0 if it is a tie.
         """
-        current_player = board.current_player
-        for i in range(limit):
-            end, winner = board.check_game_end_gomoku()
-            if end:
+        return evaluate_rollout(board, limit, self._rollout_policy, self._threats)
+
+    def _select_leaf(self, board):
+        """Select a leaf as _playout does, and expand it, adding a virtual
+        loss to every node of the path so that the next selections of a
+        tree-parallel batch prefer other paths.
+        The moves to the leaf are left on board.
+        Return: the leaf
+        """
+        tree = self._tree
+        node = tree.root
+        while(1):
+            if tree.is_leaf(node):
                 break
-            # use random move in this case
-            move_probs = rollout_policy_fn(board)
-            max_move = max(move_probs, key=itemgetter(1))[0]
-            board.play_move_gomoku(max_move, current_player)
-        else:
-            # If no break from the loop, issue a warning.
-            print("WARNING: rollout reached move limit")
-        if winner == TIE:  # tie
-            return 0
+            move, node = tree.select(node, self._c_puct)
+            self._play(board, move)
+            tree.add_virtual_loss(node)
+
+        move_probs, _ = self._policy(board)
+        end, winner = board.check_game_end_gomoku()
+        if not end:
+            tree.expand(node, move_probs)
+        return node
+
+    def _playout_batch(self, board, n_leaves):
+        """Tree-parallel playouts: select n_leaves leaves in the shared tree,
+        evaluate their rollouts together, in the pool if there is one,
+        then remove the virtual losses and propagate the values.
+        """
+        leaves = []
+        leaf_boards = []
+        n_moves = len(board.moves)
+        for i in range(n_leaves):
+            leaves.append(self._select_leaf(board))
+            leaf_boards.append(board.copy())
+            unwind(board, n_moves, self._threats)
+        rollout = partial(evaluate_rollout, policy=self._rollout_policy)
+        if self._pool is not None:
+            leaf_values = self._pool.map(rollout, leaf_boards)
         else:
-            return 1 if winner == current_player else -1
+            leaf_values = [rollout(b) for b in leaf_boards]
+        for node, leaf_value in zip(leaves, leaf_values):
+            self._tree.revert_virtual_loss(node)
+            self._tree.update_recursive(node, -leaf_value)
 
-    def get_move(self, board):
+    def _get_move_tree_parallel(self, board, time_manager=None, stop_token=None):
+        """Runs n_playout playouts in batches of leaves_per_worker leaves
+        per worker, or batches until time_manager stops them,
+        and returns the most visited action.
+        A batch is not started once stop_token is stopped.
+        """
+        if self._n_workers > 1 and self._pool is None:
+            self._pool = multiprocessing.Pool(self._n_workers,
+                                              initializer=_seed_worker)
+        n_leaves = self._n_workers * self.leaves_per_worker
+        n = 0
+        while n < self._n_playout or time_manager is not None:
+            # the root is expanded by the first batch
+            if n > 0 and stop_token is not None and stop_token.stopped():
+                break
+            if time_manager is None:
+                n_leaves = min(n_leaves, self._n_playout - n)
+            self._playout_batch(board, n_leaves)
+            n += n_leaves
+            if time_manager is not None and self._time_is_up(time_manager):
+                break
+        return self._tree.most_visited_move(self._tree.root)
+
+    def _time_is_up(self, time_manager):
+        """Report the most visited action to time_manager,
+        and return whether the search should stop.
+        """
+        self.best_move = self._tree.most_visited_move(self._tree.root)
+        time_manager.update(self.best_move)
+        return time_manager.should_stop()
+
+    def get_move(self, board, time_manager=None, stop_token=None,
+                 color_to_play=None):
         """Runs all playouts sequentially and returns the most visited action.
         board: the current game state
+        time_manager: a time_manager.TimeManager, or None. With one,
+            the playouts run until it stops them instead of n_playout,
+            so a stable best move stops early and an unstable one
+            gets more time.
+        stop_token: a time_manager.StopToken, by default the token of
+            time_manager. It is checked between playouts, whose moves
+            are undone, so that the search returns the most visited
+            action so far as soon as it is stopped.
+        color_to_play: the color of the move asked for, by default the
+            player to move of board. The book is only probed for the
+            player to move.
 
         Return: the selected action
         """
         # print("n_playout= ", self._n_playout)
-        for n in range(self._n_playout):
+        if self._book is not None and \
+            color_to_play in (None, board.current_player):
+            move = self._book.probe(board)
+            if move is not None:
+                self.best_move = move
+                return move
+        if stop_token is None and time_manager is not None:
+            stop_token = time_manager.token
+        self._start(board)
+        if self._parallel == 'tree':
+            return self._get_move_tree_parallel(board, time_manager, stop_token)
+        if self._n_workers > 1:
+            return self._get_move_root_parallel(board, time_manager, stop_token)
+        n = 0
+        while n < self._n_playout or time_manager is not None:
             # print(n)
-            # board_copy = copy.deepcopy(board)
-            board_copy = board.copy()
-            self._playout(board_copy)
+            # the root is expanded by the first playout
+            if n > 0 and stop_token is not None and stop_token.stopped():
+                break
+            self._playout(board)
 
             if n == int(self._n_playout // 2):
-                self.best_move = max(self._root._children.items(),
-                        key=lambda act_node: act_node[1]._n_visits)[0]
+                self.best_move = self._tree.most_visited_move(self._tree.root)
+            n += 1
+            if time_manager is not None and n % self.playouts_per_check == 0 \
+                and self._time_is_up(time_manager):
+                break
         
-        return max(self._root._children.items(),
-                   key=lambda act_node: act_node[1]._n_visits)[0]
+        return self._tree.most_visited_move(self._tree.root)
 
-    def update_with_move(self, last_move):
-        """Step forward in the tree, keeping everything we already know
-        about the subtree.
+    def ponder(self, board, stop_token):
+        """Runs playouts sequentially from board, the position of the root,
+        until stop_token is stopped or the tree takes max_ponder_bytes,
+        on the opponent's time (see ponder.py).
+        The tree is kept for the next get_move, after update_with_move of
+        the move of the opponent. The root-parallel search does not use
+        the tree, so it is not pondered.
         """
-        if last_move in self._root._children:
-            self._root = self._root._children[last_move]
-            self._root._parent = None
-        else:
-            self._root = TreeNode(None, 1.0)
+        if self._n_workers > 1 and self._parallel == 'root':
+            return
+        self._start(board)
+        max_nodes = self.max_ponder_bytes // self._tree.bytes_per_node()
+        while len(self._tree) < max_nodes and not stop_token.stopped():
+            self._playout(board)
+
+    def set_workers(self, n_workers):
+        """Set the number of worker processes, see __init__.
+        """
+        self._close_pool()
+        self._n_workers = n_workers
+
+    def set_rollout_policy(self, rollout_policy):
+        """Set the rollout policy, 'random' or 'pattern', see __init__.
+        """
+        self._rollout_policy = rollout_policy
+
+    def set_parallel(self, parallel):
+        """Set the parallel search, 'root' or 'tree', see __init__.
+        """
+        self._close_pool()
+        self._parallel = parallel
+
+    def _close_pool(self):
+        """Stop the worker processes, with their pending tasks.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def _get_move_root_parallel(self, board, time_manager=None, stop_token=None):
+        """Runs the playouts in n_workers processes, n_playout in total,
+        or with time_manager until it stops them, and returns the most
+        visited action over all trees.
+        The visits are merged after every task, so that time_manager,
+        if there is one, can stop the search early; once the n_playout
+        playouts are done, it gets a task of playouts_per_task more per
+        worker until it stops them. stop_token is checked every
+        poll_seconds while waiting for a task: once it is stopped,
+        the pending tasks are dropped.
+        """
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self._n_workers)
+        self._search_id += 1
+        self._root_visits = {}
+        visits_of = self._tree_visits = {}
+        n_tasks = max(self._n_workers, self._n_playout // self.playouts_per_task)
+        playouts = [self._n_playout // n_tasks + (i < self._n_playout % n_tasks)
+                    for i in range(n_tasks)]
+        while True:
+            tasks = [(self._search_id, board.copy(), n_playout,
+                      random.getrandbits(32), self._c_puct, self._rollout_policy)
+                     for n_playout in playouts]
+            if self._run_root_parallel_tasks(tasks, visits_of, time_manager,
+                                             stop_token):
+                break
+            # the playouts run on time instead of n_playout
+            playouts = [self.playouts_per_task] * self._n_workers
+        if not self._root_visits:
+            # stopped before the first task, use the order of the policy
+            return next(iter(self._policy(board)[0]))[0]
+        return max(self._root_visits.items(), key=itemgetter(1))[0]
 
+    def _run_root_parallel_tasks(self, tasks, visits_of, time_manager=None,
+                                 stop_token=None):
+        """Run tasks of _root_parallel_playouts in the pool, and merge the
+        root child visits of the tree of each process, visits_of, after
+        every task, see _get_move_root_parallel.
+        Return: whether the search is over: there is no time_manager,
+        or the search was stopped
+        """
+        results = self._pool.imap_unordered(_root_parallel_playouts, tasks)
+        while True:
+            try:
+                pid, visits = results.next(self.poll_seconds)
+            except StopIteration:
+                break
+            except multiprocessing.TimeoutError:
+                if stop_token is not None and stop_token.stopped():
+                    self._close_pool()
+                    return True
+                continue
+            visits_of[pid] = visits
+            merged = {}
+            for tree_visits in visits_of.values():
+                for move, n in tree_visits.items():
+                    merged[move] = merged.get(move, 0) + n
+            self._root_visits = merged
+            if time_manager is not None:
+                self.best_move = max(merged.items(), key=itemgetter(1))[0]
+                time_manager.update(self.best_move)
+                if time_manager.should_stop():
+                    # drop the pending tasks
+                    self._close_pool()
+                    return True
+        return time_manager is None or time_manager.should_stop() or \
+            (stop_token is not None and stop_token.stopped())
 
-    def get_best_move_so_far(self):
-        print("timeout--------")
-        return max(self._root._children.items(),
-                   key=lambda act_node: act_node[1]._n_visits)[0]
+    def update_with_move(self, last_move):
+        """Step forward in the tree, keeping everything we already know
+        about the subtree. The subtree is copied to a new pool,
+        which drops the nodes of the other moves.
+        """
+        tree = self._tree
+        for child in tree.children(tree.root):
+            if tree.move[child] == last_move:
+                self._tree = tree.subtree(child)
+                return
+        self._tree = NodePool()
 
     def __str__(self):
         return "MCTS"
@@ -211,4 +472,68 @@ class MCTS(object):
 #             print("WARNING: the board is full")
 
 #     def __str__(self):
-#         return "MCTS {}".format(self.player)
\ No newline at end of file
+#         return "MCTS {}".format(self.player)
+
+
+def benchmark_workers(board, worker_counts=(1, 2, 4), n_playout=2000):
+    """Print the playouts per second of get_move on board
+    for each number of worker processes.
+    """
+    for n_workers in worker_counts:
+        mcts = MCTS(policy_value_fn, n_playout=n_playout, n_workers=n_workers)
+        if n_workers > 1:
+            # start the pool outside of the timing
+            mcts._pool = multiprocessing.Pool(n_workers)
+        start = timer()
+        mcts.get_move(board)
+        elapsed = timer() - start
+        mcts._close_pool()
+        print("workers {} playouts/s {:.0f}".format(n_workers, n_playout / elapsed))
+
+
+def benchmark_tree_parallel(board, seconds=10, n_workers=multiprocessing.cpu_count()):
+    """Print the playouts and the tree depth reached in seconds by the
+    sequential _playout loop, and by the tree-parallel search with n_workers.
+    """
+    mcts = MCTS(policy_value_fn)
+    n_playout = 0
+    end = timer() + seconds
+    while timer() < end:
+        mcts._playout(board)
+        n_playout += 1
+    print("sequential playouts {} depth {}".format(n_playout, mcts._tree.depth(mcts._tree.root)))
+
+    mcts = MCTS(policy_value_fn, n_workers=n_workers, parallel='tree')
+    if n_workers > 1:
+        mcts._pool = multiprocessing.Pool(n_workers, initializer=_seed_worker)
+    n_leaves = n_workers * mcts.leaves_per_worker
+    n_playout = 0
+    end = timer() + seconds
+    while timer() < end:
+        mcts._playout_batch(board, n_leaves)
+        n_playout += n_leaves
+    mcts._close_pool()
+    print("tree-parallel workers {} playouts {} depth {}".format(
+        n_workers, n_playout, mcts._tree.depth(mcts._tree.root)))
+
+
+def benchmark_node_pool(board, n_playout=10000):
+    """Print the number of nodes, the memory per node and the playouts
+    per second of a sequential search of n_playout playouts on board.
+    """
+    mcts = MCTS(policy_value_fn, n_playout=n_playout)
+    start = timer()
+    mcts.get_move(board)
+    elapsed = timer() - start
+    tree = mcts._tree
+    print("nodes {} bytes/node {} total {:.1f} MB playouts/s {:.0f}".format(
+        len(tree), tree.bytes_per_node(),
+        len(tree) * tree.bytes_per_node() / 1e6, n_playout / elapsed))
+
+
+if __name__ == '__main__':
+    from bit_board import BitGoBoard
+    benchmark_workers(BitGoBoard(7),
+                      sorted(set((1, 2, 4, multiprocessing.cpu_count()))))
+    benchmark_tree_parallel(BitGoBoard(7))
+    benchmark_node_pool(BitGoBoard(7))
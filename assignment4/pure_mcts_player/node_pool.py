@@ -0,0 +1,220 @@
+"""
+node_pool.py
+
+Array-backed store of the nodes of an MCTS tree.
+A node is an index into parallel typed arrays (module array) instead of
+an object with a dict of children. The children of a node are created
+together by expand, so they occupy consecutive indices
+first_child[node] .. first_child[node] + n_children[node] - 1,
+in the order of the moves given to expand.
+"""
+
+import math
+from array import array
+import numpy as np
+
+"""
+Index of no node, the parent of the root
+"""
+NO_NODE = -1
+
+class NodePool(object):
+    """
+    Per node:
+    move         the move that leads to the node from its parent
+    parent       index of the parent, NO_NODE for the root
+    first_child  index of the first child
+    n_children   number of children, 0 for a leaf
+    n_visits     visit count
+    Q            running average of the values of its visits, from the point
+                 of view of the player who played move
+    P            prior probability of move
+    virtual_loss pending tree-parallel visits, counted as losses until they are updated
+    """
+
+    def __init__(self):
+        self.move = array('i')
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.n_children = array('i')
+        self.n_visits = array('i')
+        self.Q = array('d')
+        self.P = array('d')
+        self.virtual_loss = array('i')
+        self.root = self.new_node(NO_NODE, NO_NODE, 1.0)
+
+    def __len__(self):
+        return len(self.move)
+
+    def _buffers(self):
+        return (self.move, self.parent, self.first_child, self.n_children,
+                self.n_visits, self.Q, self.P, self.virtual_loss)
+
+    def bytes_per_node(self):
+        """
+        Memory used by one node, in bytes, not counting the unused capacity
+        of the arrays
+        """
+        return sum(buffer.itemsize for buffer in self._buffers())
+
+    def new_node(self, parent, move, prior_p):
+        index = len(self.move)
+        self.move.append(move)
+        self.parent.append(parent)
+        self.first_child.append(NO_NODE)
+        self.n_children.append(0)
+        self.n_visits.append(0)
+        self.Q.append(0.0)
+        self.P.append(prior_p)
+        self.virtual_loss.append(0)
+        return index
+
+    def is_leaf(self, node):
+        return self.n_children[node] == 0
+
+    def expand(self, node, move_priors):
+        """
+        Create the children of the leaf node.
+        move_priors: a list of tuples of moves and their prior probability
+        """
+        if self.n_children[node]:
+            return
+        first = len(self.move)
+        for move, prob in move_priors:
+            self.new_node(node, move, prob)
+        self.first_child[node] = first
+        self.n_children[node] = len(self.move) - first
+
+    def children(self, node):
+        """
+        Return the range of the indices of the children of node
+        """
+        first = self.first_child[node]
+        return range(first, first + self.n_children[node])
+
+    def child_visits(self, node):
+        """
+        Return {move: visit count} of the children of node
+        """
+        return dict((self.move[child], self.n_visits[child])
+                    for child in self.children(node))
+
+    def most_visited_move(self, node):
+        """
+        Return the move of the first child of node with the most visits
+        """
+        best = NO_NODE
+        for child in self.children(node):
+            if best == NO_NODE or self.n_visits[child] > self.n_visits[best]:
+                best = child
+        return self.move[best]
+
+    @staticmethod
+    def _view(buffer, first, count):
+        """
+        Return a NumPy view of buffer[first:first + count], without copy.
+        The view must be dropped before the pool grows.
+        """
+        return np.frombuffer(buffer, buffer.typecode, count, first * buffer.itemsize)
+
+    def select(self, node, c_puct):
+        """
+        Select the child of node that gives maximum value Q plus bonus u(P),
+        u = c_puct * P * sqrt(parent visits) / (1 + visits),
+        the first one if several are equal.
+        Virtual losses count as visits of value -1.
+        The values of all the children are computed at once on views of
+        their consecutive entries, with the same operations in the same
+        order as for a single child, so they are exactly the scalar values.
+        Return: (move, child)
+        """
+        first = self.first_child[node]
+        count = self.n_children[node]
+        n_visits = self._view(self.n_visits, first, count)
+        Q = self._view(self.Q, first, count)
+        P = self._view(self.P, first, count)
+        virtual_loss = self._view(self.virtual_loss, first, count)
+        parent_loss = self.virtual_loss[node]
+        if parent_loss or virtual_loss.any():
+            visits = n_visits + virtual_loss
+            # where virtual_loss is 0, visits may be 0 and Q is kept
+            Q = np.where(virtual_loss != 0,
+                         (Q * n_visits - virtual_loss) / np.maximum(visits, 1), Q)
+            values = Q + c_puct * P * math.sqrt(self.n_visits[node] + parent_loss) / (1 + visits)
+        else:
+            values = Q + c_puct * P * math.sqrt(self.n_visits[node]) / (1 + n_visits)
+        best = first + int(values.argmax())
+        return self.move[best], best
+
+    def update_recursive(self, node, leaf_value):
+        """
+        Count a visit of value leaf_value of node, and of value
+        -leaf_value, leaf_value, ... of its ancestors up to the root
+        """
+        n_visits = self.n_visits
+        Q = self.Q
+        while node != NO_NODE:
+            n_visits[node] += 1
+            Q[node] += 1.0 * (leaf_value - Q[node]) / n_visits[node]
+            leaf_value = -leaf_value
+            node = self.parent[node]
+
+    def add_virtual_loss(self, node):
+        self.virtual_loss[node] += 1
+
+    def revert_virtual_loss(self, node):
+        """
+        Remove the virtual loss of one pending visit from node
+        and its ancestors, except the root
+        """
+        while self.parent[node] != NO_NODE:
+            self.virtual_loss[node] -= 1
+            node = self.parent[node]
+
+    def clear_virtual_loss(self):
+        for i in range(len(self.virtual_loss)):
+            self.virtual_loss[i] = 0
+
+    def depth(self, node):
+        """
+        Return the depth of the deepest node below node
+        """
+        depth = 0
+        level = [node]
+        while level:
+            level = [child for n in level for child in self.children(n)]
+            if level:
+                depth += 1
+        return depth
+
+    def subtree(self, node):
+        """
+        Return a new pool holding a copy of the subtree of node, node being
+        its root. The nodes are copied level by level, so that the children
+        of a node stay consecutive.
+        """
+        pool = NodePool()
+        root = pool.root
+        pool.move[root] = self.move[node]
+        pool.n_visits[root] = self.n_visits[node]
+        pool.Q[root] = self.Q[node]
+        pool.P[root] = self.P[node]
+        queue = [(node, root)]
+        for old, new in queue:
+            count = self.n_children[old]
+            if not count:
+                continue
+            first = self.first_child[old]
+            new_first = len(pool.move)
+            pool.move.extend(self.move[first:first + count])
+            pool.parent.extend(array('i', [new]) * count)
+            pool.first_child.extend(array('i', [NO_NODE]) * count)
+            pool.n_children.extend(array('i', [0]) * count)
+            pool.n_visits.extend(self.n_visits[first:first + count])
+            pool.Q.extend(self.Q[first:first + count])
+            pool.P.extend(self.P[first:first + count])
+            pool.virtual_loss.extend(array('i', [0]) * count)
+            pool.first_child[new] = new_first
+            pool.n_children[new] = count
+            queue.extend((first + k, new_first + k) for k in range(count))
+        return pool
@@ -0,0 +1,102 @@
+"""
+opening_book.py
+
+Opening book of gomoku: the move to play in every position of the first
+plies, found offline by a deep search
+(see opening_book.py of the gomoku4 player, which builds the book file).
+
+Positions are keyed by the smallest Zobrist hash of the 8 symmetric images
+of the position, marked with the player to move, so the book holds one
+entry per symmetry class.
+The key is computed from the stones of board.moves, which are few in the
+positions of the book.
+
+File format, little-endian:
+    header   HEADER  magic, board size, plies, number of records
+    records  RECORD  key, move, sorted by key
+move: the move to play, as a point of the canonical image of the position
+
+The file is read once at startup and searched by bisection.
+"""
+
+import os
+import struct
+from board_util import EMPTY, WHITE, zobrist_table, symmetry_table, INVERSE_SYMMETRY
+
+HEADER = struct.Struct('<4sIII')
+RECORD = struct.Struct('<QB')
+MAGIC = b'GOBK'
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening.book')
+BOOK_PLIES = 3
+
+def book_key(board):
+    """
+    Return (key, s): the key of the position of board, and the symmetry s
+    that maps the position to its canonical image
+    """
+    zobrist = zobrist_table(board.maxpoint)
+    side = zobrist[EMPTY][0] if board.current_player == WHITE else 0
+    best = None
+    for s, permutation in enumerate(symmetry_table(board.size)):
+        key = 0
+        for move in board.moves:
+            key ^= zobrist[move[1]][permutation[move[0]]]
+        if best is None or key < best[0]:
+            best = (key, s)
+    return best[0] ^ side, best[1]
+
+class OpeningBook(object):
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        magic, self.size, self.plies, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not an opening book".format(path))
+
+    def lookup(self, key):
+        """
+        Return the move of the record of key, or None
+        """
+        data = self.data
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            record_key, move = RECORD.unpack_from(data, HEADER.size + middle * RECORD.size)
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return move
+        return None
+
+    def probe(self, board):
+        """
+        Return the book move of the player to move on board,
+        as a point of board, or None if the position is not in the book
+        """
+        if board.size != self.size or len(board.moves) >= self.plies:
+            return None
+        key, s = book_key(board)
+        move = self.lookup(key)
+        if move is None:
+            return None
+        return symmetry_table(board.size)[INVERSE_SYMMETRY[s]][move]
+
+"""
+Books opened by open_book, by path
+"""
+_books = {}
+
+def open_book(path = DEFAULT_PATH):
+    """
+    Return the OpeningBook of path, read once, or None if there is none
+    """
+    if path not in _books:
+        if os.path.exists(path):
+            _books[path] = OpeningBook(path)
+        else:
+            _books[path] = None
+    return _books[path]
@@ -12,7 +12,8 @@ The board uses a 1-dimensional representation with padding
 import numpy as np
 from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, \
                        PASS, is_black_white, coord_to_point, where1d, \
-                       MAXSIZE, NULLPOINT, TIE
+                       MAXSIZE, NULLPOINT, TIE, \
+                       CANDIDATE_RADIUS, neighbourhood_masks
 import alphabeta
 
 class SimpleGoBoard(object):
@@ -87,17 +88,65 @@ class SimpleGoBoard(object):
         self.liberty_of = np.full(self.maxpoint, NULLPOINT, dtype = np.int32)
         self._initialize_empty_points(self.board)
         self._initialize_neighbors()
+        self.moves = []
+        # gomoku winner so far, kept up to date by play/undo
+        self.winner = None
+        # mask of the points within candidate_radius of a stone, and its
+        # value before each move, kept up to date by play/undo
+        self.candidate_radius = CANDIDATE_RADIUS
+        self._neighbourhood = neighbourhood_masks(size, self.candidate_radius)
+        self.near_bits = 0
+        self._near_stack = []
 
     def copy(self):
-        b = SimpleGoBoard(self.size)
-        assert b.NS == self.NS
-        assert b.WE == self.WE
-        b.ko_recapture = self.ko_recapture
-        b.current_player = self.current_player
-        assert b.maxpoint == self.maxpoint
+        """
+        Copy the position without resetting a new board:
+        the neighbor table, which only depends on the size, is shared
+        """
+        b = SimpleGoBoard.__new__(SimpleGoBoard)
+        b.__dict__.update(self.__dict__)
         b.board = np.copy(self.board)
+        b.liberty_of = np.copy(self.liberty_of)
+        b.moves = list(self.moves)
+        b._near_stack = list(self._near_stack)
         return b
 
+    def set_candidate_radius(self, radius):
+        """
+        Set the Chebyshev distance to a stone of the candidate moves
+        """
+        self.candidate_radius = radius
+        self._neighbourhood = neighbourhood_masks(self.size, radius)
+        self.near_bits = 0
+        self._near_stack = []
+        for move in self.moves:
+            self._near_stack.append(self.near_bits)
+            self.near_bits |= self._neighbourhood[move[0]]
+
+    def get_candidate_moves(self):
+        """
+        Return:
+            The empty points within candidate_radius of a stone,
+            or all the empty points if there is no stone
+        """
+        if not self.moves:
+            return self.get_empty_points()
+        board = self.board
+        return np.array([point for point in self._bit_points(self.near_bits)
+                         if board[point] == EMPTY], dtype = np.int64)
+
+    @staticmethod
+    def _bit_points(bits):
+        """
+        Return the list of points whose bit is set in bits
+        """
+        points = []
+        while bits:
+            low = bits & -bits
+            points.append(low.bit_length() - 1)
+            bits ^= low
+        return points
+
     def row_start(self, row):
         assert row >= 1
         assert row <= self.size
@@ -348,8 +397,19 @@ class SimpleGoBoard(object):
         if self.board[point] != EMPTY:
             return False
         self.board[point] = color
+        self.moves.append((point, color, self.winner))
+        self._near_stack.append(self.near_bits)
+        self.near_bits |= self._neighbourhood[point]
+        if self.winner is None and self.point_check_game_end_gomoku(point):
+            self.winner = color
         self.current_player = GoBoardUtil.opponent(color)
         return True
+
+    def undo_move_gomoku(self):
+        last_move, last_color, self.winner = self.moves.pop()
+        self.near_bits = self._near_stack.pop()
+        self.board[last_move] = EMPTY
+        self.current_player = GoBoardUtil.opponent(self.current_player)
         
     def _point_direction_check_connect_gomoko(self, point, shift):
         """
@@ -368,6 +428,9 @@ class SimpleGoBoard(object):
                     break
             else:
                 break
+        if count == 5:
+            # an overline would count more than 5 in the other direction
+            return True
         d = -d
         p = point
         while True:
@@ -406,25 +469,25 @@ class SimpleGoBoard(object):
     def check_game_end_gomoku(self):
         """
             Check if the game ends for the game of Gomoku.
+            The winner is updated by play_move_gomoku and undo_move_gomoku,
+            from the four lines through the last move only.
             """
-        white_points = where1d(self.board == WHITE)
-        black_points = where1d(self.board == BLACK)
-
-        if len(GoBoardUtil.generate_legal_moves_gomoku(self)) == 0:
+        if len(self.get_empty_points()) == 0:
             return True, TIE
-        
-        for point in white_points:
-            if self.point_check_game_end_gomoku(point):
-                return True, WHITE
-    
-        for point in black_points:
-            if self.point_check_game_end_gomoku(point):
-                return True, BLACK
-
+        if self.winner is not None:
+            return True, self.winner
         return False, None
 
-    def solve(self):
-        result, move, drawMove = alphabeta.solve(self)
+    def solve(self, stop_token=None):
+        """
+        Solve the position for the player to move, see alphabeta.solve.
+        Return (winner, move), ('unknown', 'NoMove') if stop_token,
+        a StopToken, stopped the solver first.
+        """
+        solution = alphabeta.solve(self, stop_token)
+        if solution is None:
+            return 'unknown', 'NoMove'
+        result, move, drawMove = solution
         if move=="First":
             if result==0:
                 return 'draw',drawMove
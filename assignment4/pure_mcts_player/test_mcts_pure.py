@@ -0,0 +1,128 @@
+"""
+test_mcts_pure.py
+
+Correctness checks of the searches timed by the benchmarks of mcts_pure.py:
+the sequential search on a NodePool, the root-parallel and the tree-parallel
+searches. Run with pytest from this directory.
+"""
+
+import random
+import numpy as np
+from bit_board import BitGoBoard
+from board_util import GoBoardUtil, coord_to_point
+from mcts_pure import MCTS, policy_value_fn
+from time_manager import TimeManager, StopToken
+
+def opening(size=7):
+    board = BitGoBoard(size)
+    for row, col in [(4, 4), (3, 3), (5, 5)]:
+        board.play_move_gomoku(coord_to_point(row, col, size), board.current_player)
+    return board
+
+def position(board):
+    return list(board.moves), board.black_bits, board.white_bits, board.current_player
+
+def check_legal(board, move):
+    assert move in set(int(p) for p in board.get_empty_points())
+
+def test_sequential_tree_visits():
+    random.seed(0)
+    np.random.seed(0)
+    board = opening()
+    before = position(board)
+    mcts = MCTS(policy_value_fn, n_playout=300)
+    move = mcts.get_move(board)
+    assert position(board) == before
+    check_legal(board, move)
+    tree = mcts._tree
+    assert tree.n_visits[tree.root] == 300
+    # a node is visited once as a leaf, then through its children
+    for node in range(len(tree)):
+        children = list(tree.children(node))
+        if children:
+            assert tree.n_visits[node] == 1 + sum(tree.n_visits[c] for c in children)
+    assert move == tree.most_visited_move(tree.root)
+
+def test_subtree_keeps_visits():
+    random.seed(1)
+    np.random.seed(1)
+    mcts = MCTS(policy_value_fn, n_playout=200)
+    move = mcts.get_move(opening())
+    tree = mcts._tree
+    child = [c for c in tree.children(tree.root) if tree.move[c] == move][0]
+    visits = tree.n_visits[child]
+    mcts.update_with_move(move)
+    subtree = mcts._tree
+    assert subtree.n_visits[subtree.root] == visits
+    assert sum(subtree.n_visits[c] for c in subtree.children(subtree.root)) == visits - 1
+
+def test_root_parallel_merges_all_tasks():
+    board = opening()
+    before = position(board)
+    mcts = MCTS(policy_value_fn, n_playout=200, n_workers=2)
+    try:
+        move = mcts.get_move(board)
+    finally:
+        mcts._close_pool()
+    assert position(board) == before
+    check_legal(board, move)
+    # a worker process grows one tree over all of its tasks: the first
+    # playout expands its root, the others visit one root child each
+    assert sum(mcts._root_visits.values()) == 200 - len(mcts._tree_visits)
+
+def test_root_parallel_runs_on_time():
+    board = opening()
+    mcts = MCTS(policy_value_fn, n_playout=20, n_workers=2)
+    time_manager = TimeManager(2, len(board.get_empty_points()), board.size)
+    try:
+        move = mcts.get_move(board, time_manager)
+    finally:
+        mcts._close_pool()
+    check_legal(board, move)
+    # the tasks go on past n_playout until the soft deadline
+    assert time_manager.should_stop()
+    assert sum(mcts._root_visits.values()) + len(mcts._tree_visits) > 20
+
+def test_tree_parallel_reverts_virtual_losses():
+    board = opening()
+    before = position(board)
+    mcts = MCTS(policy_value_fn, n_playout=64, n_workers=2, parallel='tree')
+    try:
+        move = mcts.get_move(board)
+    finally:
+        mcts._close_pool()
+    assert position(board) == before
+    check_legal(board, move)
+    tree = mcts._tree
+    assert tree.n_visits[tree.root] == 64
+    assert max(tree.virtual_loss) == 0
+
+class CountingBook(object):
+    """
+    A book without moves that counts its probes
+    """
+    def __init__(self):
+        self.probes = 0
+
+    def probe(self, board):
+        self.probes += 1
+        return None
+
+def test_book_is_probed_for_player_to_move_only():
+    board = opening()
+    book = CountingBook()
+    mcts = MCTS(policy_value_fn, n_playout=20, book=book)
+    mcts.get_move(board, color_to_play=GoBoardUtil.opponent(board.current_player))
+    assert book.probes == 0
+    mcts.get_move(board, color_to_play=board.current_player)
+    assert book.probes == 1
+
+def test_ponder_stops_at_memory_limit():
+    board = opening()
+    before = position(board)
+    mcts = MCTS(policy_value_fn)
+    mcts.max_ponder_bytes = 1000 * mcts._tree.bytes_per_node()
+    mcts.ponder(board, StopToken())
+    assert position(board) == before
+    # the last playout expands a leaf past the limit
+    assert 1000 <= len(mcts._tree) < 1000 + len(board.get_empty_points())
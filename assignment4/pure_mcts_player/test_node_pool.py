@@ -0,0 +1,63 @@
+"""
+test_node_pool.py
+
+Differential test of the vectorized NodePool.select against the scalar
+PUCT selection, one child at a time, on random pools with and without
+virtual losses. Run with pytest from this directory.
+"""
+
+import math
+import random
+from node_pool import NodePool, NO_NODE
+
+def scalar_select(tree, node, c_puct):
+    """
+    The child of node with the largest Q + u, the first one if several are
+    equal, computed child by child; virtual losses count as visits of value -1
+    """
+    best = NO_NODE
+    best_value = 0.0
+    sqrt_parent = math.sqrt(tree.n_visits[node] + tree.virtual_loss[node])
+    for child in tree.children(node):
+        vl = tree.virtual_loss[child]
+        visits = tree.n_visits[child] + vl
+        q = tree.Q[child]
+        if vl:
+            q = (tree.Q[child] * tree.n_visits[child] - vl) / visits
+        value = q + c_puct * tree.P[child] * sqrt_parent / (1 + visits)
+        if best == NO_NODE or value > best_value:
+            best = child
+            best_value = value
+    return tree.move[best], best
+
+def random_pool(rng, virtual_losses):
+    tree = NodePool()
+    count = rng.randint(1, 49)
+    moves = rng.sample(range(9, 64), count)
+    # few distinct priors, visits and values, so that some children are equal
+    tree.expand(tree.root, [(move, rng.choice((0.02, 0.05, 1.0 / count)))
+                            for move in moves])
+    for child in tree.children(tree.root):
+        tree.n_visits[child] = rng.choice((0, 0, 1, 2, 3, rng.randint(0, 500)))
+        if tree.n_visits[child]:
+            tree.Q[child] = rng.choice((-1.0, 0.0, 0.5, rng.uniform(-1, 1)))
+        if virtual_losses and rng.random() < 0.3:
+            tree.virtual_loss[child] = rng.randint(1, 4)
+    tree.n_visits[tree.root] = 1 + sum(tree.n_visits[child]
+                                       for child in tree.children(tree.root))
+    if virtual_losses and rng.random() < 0.5:
+        tree.virtual_loss[tree.root] = rng.randint(1, 8)
+    return tree
+
+def check_select(virtual_losses, seed):
+    rng = random.Random(seed)
+    for n in range(3000):
+        tree = random_pool(rng, virtual_losses)
+        for c_puct in (0.5, 5):
+            assert tree.select(tree.root, c_puct) == scalar_select(tree, tree.root, c_puct)
+
+def test_select_matches_scalar():
+    check_select(False, seed = 0)
+
+def test_select_matches_scalar_with_virtual_losses():
+    check_select(True, seed = 1)
@@ -0,0 +1,287 @@
+"""
+threat_tracker.py
+
+Incremental threat detection for gomoku searches and rollouts.
+The same module is copied in every player that uses it.
+
+ThreatTracker follows the moves played on a board and keeps, for each color,
+the threat points of the position:
+- win points, where a move makes five
+- open-four points, where a move makes an open four .xxxx.
+They are found from the number of stones of each color in every window of
+5 points (xxxx. x.xxx ...) and of 6 points (.xxx.. .xx.x. ...), and only the
+windows through a move are updated when it is played or undone.
+The empty points are kept in a list with the index of each point,
+so that they can be listed without scanning the board, and a random move
+is sampled, removed and restored in O(1).
+Used by:
+- the pattern-guided rollouts of MCTS, through threat_moves and rollout_move
+- the threat-space search and the df-pn solver, through the threat points
+  and four_moves, open_four_blocks and three_moves.
+"""
+
+import random
+from board_util import BLACK, WHITE, EMPTY, BORDER, GoBoardUtil
+
+"""
+Movetype of threat_moves and rollout_move, in order of preference
+"""
+WIN = 0
+BLOCK_WIN = 1
+OPEN_FOUR = 2
+BLOCK_OPEN_FOUR = 3
+RANDOM = 4
+
+"""
+Precomputed windows, shared by all trackers of the same size.
+_tables[size] = (windows5, windows5_of, windows6, windows6_of)
+windows5[w] is the tuple of the points of a window of 5 points,
+windows5_of[point] the list of the windows5 that contain point.
+windows6[w] is the tuple of the points of a window of 6 points,
+windows6_of[point] the list of (w, is_end) of the windows6 that contain point,
+with is_end true if point is the first or last point of w.
+"""
+_tables = {}
+
+def _build_tables(size):
+    NS = size + 1
+    maxpoint = size * size + 3 * (size + 1)
+
+    def on_board(row, col):
+        return 1 <= row <= size and 1 <= col <= size
+
+    windows = {5: [], 6: []}
+    for row in range(1, size + 1):
+        for col in range(1, size + 1):
+            for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                for length in (5, 6):
+                    end_row = row + (length - 1) * dr
+                    end_col = col + (length - 1) * dc
+                    if on_board(end_row, end_col):
+                        windows[length].append(tuple(
+                            (row + k * dr) * NS + col + k * dc
+                            for k in range(length)))
+    windows5_of = [[] for _ in range(maxpoint)]
+    for w, points in enumerate(windows[5]):
+        for point in points:
+            windows5_of[point].append(w)
+    windows6_of = [[] for _ in range(maxpoint)]
+    for w, points in enumerate(windows[6]):
+        for k, point in enumerate(points):
+            windows6_of[point].append((w, k == 0 or k == 5))
+    return windows[5], windows5_of, windows[6], windows6_of
+
+def get_tables(size):
+    if size not in _tables:
+        _tables[size] = _build_tables(size)
+    return _tables[size]
+
+
+class ThreatTracker(object):
+
+    def __init__(self, board):
+        """
+        Start tracking the position of board.
+        The moves played on board after that must be given to play and undo.
+        """
+        self.windows5, self.windows5_of, self.windows6, self.windows6_of = \
+            get_tables(board.size)
+        self.cells = [board.get_color(point) for point in range(board.maxpoint)]
+        self.empties = [point for point in range(board.maxpoint)
+                        if self.cells[point] == EMPTY]
+        self.index_of = {}
+        for index, point in enumerate(self.empties):
+            self.index_of[point] = index
+        # count5[color][w]: stones of color in windows5[w]
+        # inner6[color][w]: stones of color in the 4 inner points of windows6[w]
+        # ends6[w]: stones on the 2 end points of windows6[w]
+        self.count5 = {BLACK: [0] * len(self.windows5), WHITE: [0] * len(self.windows5)}
+        self.inner6 = {BLACK: [0] * len(self.windows6), WHITE: [0] * len(self.windows6)}
+        self.ends6 = [0] * len(self.windows6)
+        # the threat point of each window, (color, point) or None
+        self.threat5 = [None] * len(self.windows5)
+        self.threat6 = [None] * len(self.windows6)
+        # wins[color][point], fours[color][point]: number of windows
+        # that make point a win or open-four point of color
+        self.wins = {BLACK: {}, WHITE: {}}
+        self.fours = {BLACK: {}, WHITE: {}}
+        for w, points in enumerate(self.windows5):
+            for point in points:
+                color = self.cells[point]
+                if color == BLACK or color == WHITE:
+                    self.count5[color][w] += 1
+            self._update5(w)
+        for w, points in enumerate(self.windows6):
+            for k, point in enumerate(points):
+                color = self.cells[point]
+                if color == BLACK or color == WHITE:
+                    if k == 0 or k == 5:
+                        self.ends6[w] += 1
+                    else:
+                        self.inner6[color][w] += 1
+            self._update6(w)
+
+    @staticmethod
+    def _add(refs, color, point):
+        refs[color][point] = refs[color].get(point, 0) + 1
+
+    @staticmethod
+    def _remove(refs, color, point):
+        n = refs[color][point] - 1
+        if n:
+            refs[color][point] = n
+        else:
+            del refs[color][point]
+
+    def _empty_point(self, points):
+        for point in points:
+            if self.cells[point] == EMPTY:
+                return point
+
+    def _update5(self, w):
+        """
+        Recompute the threat of windows5[w]: 4 stones of one color and none
+        of the other make its empty point a win point of that color
+        """
+        if self.count5[BLACK][w] == 4 and self.count5[WHITE][w] == 0:
+            threat = (BLACK, self._empty_point(self.windows5[w]))
+        elif self.count5[WHITE][w] == 4 and self.count5[BLACK][w] == 0:
+            threat = (WHITE, self._empty_point(self.windows5[w]))
+        else:
+            threat = None
+        old = self.threat5[w]
+        if threat != old:
+            if old is not None:
+                self._remove(self.wins, old[0], old[1])
+            if threat is not None:
+                self._add(self.wins, threat[0], threat[1])
+            self.threat5[w] = threat
+
+    def _update6(self, w):
+        """
+        Recompute the threat of windows6[w]: empty ends and 3 inner stones
+        of one color and none of the other make its inner empty point
+        an open-four point of that color
+        """
+        threat = None
+        if self.ends6[w] == 0:
+            if self.inner6[BLACK][w] == 3 and self.inner6[WHITE][w] == 0:
+                threat = (BLACK, self._empty_point(self.windows6[w][1:5]))
+            elif self.inner6[WHITE][w] == 3 and self.inner6[BLACK][w] == 0:
+                threat = (WHITE, self._empty_point(self.windows6[w][1:5]))
+        old = self.threat6[w]
+        if threat != old:
+            if old is not None:
+                self._remove(self.fours, old[0], old[1])
+            if threat is not None:
+                self._add(self.fours, threat[0], threat[1])
+            self.threat6[w] = threat
+
+    def play(self, point, color):
+        self.cells[point] = color
+        # swap point with the last empty point, and drop it
+        index = self.index_of.pop(point)
+        last = self.empties.pop()
+        if last != point:
+            self.empties[index] = last
+            self.index_of[last] = index
+        self._update_windows(point, color, 1)
+
+    def undo(self, point, color):
+        self.cells[point] = EMPTY
+        self.index_of[point] = len(self.empties)
+        self.empties.append(point)
+        self._update_windows(point, color, -1)
+
+    def _update_windows(self, point, color, delta):
+        count5 = self.count5[color]
+        for w in self.windows5_of[point]:
+            count5[w] += delta
+            self._update5(w)
+        inner6 = self.inner6[color]
+        for w, is_end in self.windows6_of[point]:
+            if is_end:
+                self.ends6[w] += delta
+            else:
+                inner6[w] += delta
+            self._update6(w)
+
+    def threat_moves(self, color):
+        """
+        Return (movetype, moves) of the first non-empty kind of threat points
+        for color to play: its win points, the win points of the opponent,
+        its open-four points, the open-four points of the opponent,
+        or (RANDOM, []) if there are none.
+        """
+        opponent = GoBoardUtil.opponent(color)
+        for movetype, points in ((WIN, self.wins[color]),
+                                 (BLOCK_WIN, self.wins[opponent]),
+                                 (OPEN_FOUR, self.fours[color]),
+                                 (BLOCK_OPEN_FOUR, self.fours[opponent])):
+            if points:
+                return movetype, list(points)
+        return RANDOM, []
+
+    def rollout_move(self, color):
+        """
+        Return a move for color: a random threat point of the first kind
+        found by threat_moves, or else a random empty point
+        """
+        movetype, moves = self.threat_moves(color)
+        if moves:
+            return random.choice(moves)
+        return self.empties[random.randrange(len(self.empties))]
+
+    def four_moves(self, color):
+        """
+        Return the set of points where a move of color makes a four,
+        a new win point: the empty points of the windows5 holding
+        3 stones of color and none of the opponent
+        """
+        opponent = GoBoardUtil.opponent(color)
+        count5 = self.count5[color]
+        other5 = self.count5[opponent]
+        cells = self.cells
+        moves = set()
+        for w, points in enumerate(self.windows5):
+            if count5[w] == 3 and other5[w] == 0:
+                for point in points:
+                    if cells[point] == EMPTY:
+                        moves.add(point)
+        return moves
+
+    def open_four_blocks(self, color):
+        """
+        Return None if color has no open-four point, else the set of points
+        that take a point in every window giving color an open-four point:
+        any other move, unless it makes a four, lets color play an open four.
+        """
+        blocks = None
+        for w, threat in enumerate(self.threat6):
+            if threat is not None and threat[0] == color:
+                points = self.windows6[w]
+                killers = set((points[0], threat[1], points[5]))
+                if blocks is None:
+                    blocks = killers
+                else:
+                    blocks &= killers
+        return blocks
+
+    def three_moves(self, color):
+        """
+        Return the set of points where a move of color makes an open three,
+        a new open-four point: the inner empty points of the windows6 with
+        empty ends, 2 inner stones of color and none of the opponent
+        """
+        opponent = GoBoardUtil.opponent(color)
+        inner6 = self.inner6[color]
+        other6 = self.inner6[opponent]
+        ends6 = self.ends6
+        cells = self.cells
+        moves = set()
+        for w, points in enumerate(self.windows6):
+            if inner6[w] == 2 and other6[w] == 0 and ends6[w] == 0:
+                for point in points[1:5]:
+                    if cells[point] == EMPTY:
+                        moves.add(point)
+        return moves